@@ -6,6 +6,7 @@ const API_URL = Constants.expoConfig?.extra?.backendUrl || 'http://localhost:500
 
 // Type definitions for Vision API response
 interface VisionResponse {
+  original_text?: string;
   bounding_box_text?: string;
   responses?: Array<{
     textAnnotations?: Array<{
@@ -15,6 +16,59 @@ interface VisionResponse {
   error?: string;
 }
 
+// Response of the upload deduplication handshake
+interface PreflightResponse {
+  status: 'hit' | 'upload_required';
+  match?: 'exact' | 'perceptual';
+  result?: VisionResponse;
+}
+
+/**
+ * Asks the backend whether it already has OCR results for this image, so the
+ * (often multi-megabyte) upload can be skipped
+ * @param {string} imageUri - The file URI of the image
+ * @param {boolean} useBoundingBox - Whether to use bounding box text processing
+ * @returns {Promise<VisionResponse | null>} - The cached result, or null if the image must be uploaded
+ */
+const preflightDetect = async (
+  imageUri: string,
+  useBoundingBox: boolean
+): Promise<VisionResponse | null> => {
+  try {
+    // MD5 is computed natively and matches the server's content hash
+    const info = await FileSystem.getInfoAsync(imageUri, { md5: true });
+    if (!info.exists || !info.md5) {
+      return null;
+    }
+    
+    const response = await fetch(`${API_URL}/api/vision/preflight`, {
+      method: 'POST',
+      body: JSON.stringify({
+        content_hash: info.md5,
+        use_bounding_box: useBoundingBox,
+        response_mode: 'slim',
+      }),
+      headers: {
+        'Content-Type': 'application/json',
+      },
+    });
+    if (!response.ok) {
+      return null;
+    }
+    
+    const preflight: PreflightResponse = await response.json();
+    if (preflight.status === 'hit' && preflight.result) {
+      console.log(`Preflight ${preflight.match} hit, skipping image upload`);
+      return preflight.result;
+    }
+    return null;
+  } catch (error) {
+    // The handshake is only an optimisation; fall back to uploading
+    console.warn('Preflight failed, uploading image:', error);
+    return null;
+  }
+};
+
 /**
  * Detects text in an image using the backend API
  * @param {string} imageUri - The file URI of the image
@@ -30,6 +84,12 @@ export const detectText = async (
     console.log('Backend URL:', API_URL);
     console.log('Using bounding box processing:', useBoundingBox);
     
+    // Skip the upload if the backend already has OCR results for this image
+    const cached = await preflightDetect(imageUri, useBoundingBox);
+    if (cached) {
+      return cached;
+    }
+    
     // Create a FormData object to send the image
     const formData = new FormData();
     
@@ -44,6 +104,9 @@ export const detectText = async (
     // Add bounding box preference as a parameter
     formData.append('use_bounding_box', useBoundingBox ? 'true' : 'false');
     
+    // Only the text fields are used, so skip the raw Vision annotations
+    formData.append('response_mode', 'slim');
+    
     // Make API request to our backend
     const response = await fetch(`${API_URL}/api/vision/detect`, {
       method: 'POST',
@@ -89,12 +152,13 @@ export const getDetectedText = (
     }
     
     // Use original text when bounding box is disabled or not available
-    if (!visionResponse?.responses?.[0]?.textAnnotations?.[0]?.description) {
+    // (slim responses carry it as original_text, full responses in the first annotation)
+    const fullText = visionResponse?.original_text || 
+      visionResponse?.responses?.[0]?.textAnnotations?.[0]?.description;
+    if (!fullText) {
       return "No text detected";
     }
 
-    // Get the full text from the first annotation which contains all detected text
-    const fullText = visionResponse.responses[0].textAnnotations[0].description;
     console.log('Using original extracted text:', fullText);
     
     return fullText;
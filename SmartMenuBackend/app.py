@@ -3,10 +3,26 @@ from flask_cors import CORS
 import os
 import logging
 import json
+import gzip
 from dotenv import load_dotenv
-from app.services.vision_service import detect_text
+from app.services.vision_service import detect_text, warm_up, build_slim_response, DESKEW_MODE
 from app.services.ai_parsing_service import parse_menu_with_ai
 from app.services.translation_service import translate_text
+from app.services.ocr_cache import get_ocr_cache, content_hash, perceptual_hash, options_key
+from app.services.rate_limiter import limiter_stats
+from app.services.hedging import hedging_stats
+from app.profiling import PROFILING_ENABLED, install_profiling, stage
+from app.deadline import DeadlineExceeded, install_deadlines, incomplete_work
+
+# Optional fast paths: orjson for serialization, brotli for compression
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,11 +35,121 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Heavy dependencies (OpenCV, numpy) load lazily on the first image request.
+# Set PRELOAD_HEAVY_IMPORTS=true to load them at startup instead; combined with
+# gunicorn's preload_app the pages are shared copy-on-write between workers.
+if os.environ.get('PRELOAD_HEAVY_IMPORTS', 'false').lower() == 'true':
+    warm_up()
+
+# Opt-in per-request profiling (X-Profile header or ?profile=1); nothing is hooked in unless enabled
+if PROFILING_ENABLED:
+    install_profiling(app)
+
+# Per-request deadline from the X-Request-Timeout header or REQUEST_DEADLINE_SECONDS
+install_deadlines(app)
+
+# Responses smaller than this are not worth compressing
+COMPRESSION_MIN_BYTES = 1024
+
+def dumps_json(payload):
+    """Serializes a payload to compact UTF-8 JSON bytes, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def compressed_json_response(payload, status=200):
+    """
+    Builds a JSON response, compressed with brotli or gzip if the client accepts it
+    
+    Args:
+        payload: JSON-serializable object
+        status: HTTP status code
+        
+    Returns:
+        Response: The Flask response
+    """
+    with stage('serialize_response'):
+        body = dumps_json(payload)
+    encoding = None
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        with stage('compress_response'):
+            if brotli is not None and request.accept_encodings['br']:
+                body = brotli.compress(body, quality=5)
+                encoding = 'br'
+            elif request.accept_encodings['gzip']:
+                body = gzip.compress(body, compresslevel=5)
+                encoding = 'gzip'
+    
+    response = app.response_class(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def add_incomplete_work(payload):
+    """
+    Marks a response as partial when the request deadline or an upstream
+    failure left work unfinished
+    
+    Args:
+        payload (dict): The response body
+        
+    Returns:
+        dict: The payload, with incomplete_chunks (and deadline_exceeded if the
+              deadline cut work off) when applicable
+    """
+    incomplete = incomplete_work()
+    if incomplete:
+        logger.warning(f"Returning partial results ({len(incomplete)} incomplete)")
+        if any(chunk['reason'] == 'deadline' for chunk in incomplete):
+            payload['deadline_exceeded'] = True
+        payload['incomplete_chunks'] = sorted(incomplete, key=lambda chunk: (chunk['stage'], chunk['index']))
+    return payload
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({"status": "ok", "message": "SmartMenu API is running"}), 200
 
+@app.route('/api/upstreams/stats', methods=['GET'])
+def upstream_stats():
+    """Per-upstream limiter, hedging and fallback counters for this worker process"""
+    return jsonify({"limits": limiter_stats(), "hedging": hedging_stats()}), 200
+
+def read_detect_options(values):
+    """
+    Reads the text detection options shared by /api/vision/detect and /api/vision/preflight
+    
+    Args:
+        values: Form fields or the JSON body of the request
+        
+    Returns:
+        dict: use_bounding_box, split_columns, deskew_mode, response_mode and include_lines
+    """
+    def flag(name, default):
+        value = values.get(name, default)
+        return value if isinstance(value, bool) else str(value).lower() == 'true'
+    
+    return {
+        # Bounding box processing and column segmentation default to enabled
+        'use_bounding_box': flag('use_bounding_box', 'true'),
+        'split_columns': flag('split_columns', 'true'),
+        # 'geometry' skips the pixel deskew and straightens the word boxes instead
+        'deskew_mode': values.get('deskew_mode'),
+        # 'slim' returns only the text fields the app needs instead of the raw Vision payload
+        'response_mode': str(values.get('response_mode', 'full')).lower(),
+        'include_lines': flag('include_lines', 'false'),
+    }
+
+def format_vision_response(vision_response, options):
+    """Applies the requested response mode to a detect_text result"""
+    if options['response_mode'] == 'slim':
+        # A deskewed crop's boxes are rotated back to the photo's frame, so they are skewed again
+        correct_skew = ((options['deskew_mode'] or DESKEW_MODE).lower() == 'geometry' or
+                        bool((vision_response.get('menu_crop') or {}).get('angle')))
+        return build_slim_response(vision_response, options['include_lines'], options['split_columns'], correct_skew)
+    return vision_response
+
 @app.route('/api/vision/detect', methods=['POST'])
 def vision_detect():
     """Endpoint for text detection in images"""
@@ -37,19 +163,66 @@ def vision_detect():
         logger.error("Empty filename")
         return jsonify({"error": "No image selected"}), 400
     
-    # Get the bounding box parameter (defaults to enabled if not specified)
-    use_bounding_box = request.form.get('use_bounding_box', 'true').lower() == 'true'
-    logger.info(f"Bounding box processing: {'enabled' if use_bounding_box else 'disabled'}")
+    options = read_detect_options(request.values)
+    logger.info(f"Bounding box processing: {'enabled' if options['use_bounding_box'] else 'disabled'}")
     
     try:
-        # Process the image with Vision API
-        logger.info(f"Processing image: {image_file.filename}")
-        vision_response = detect_text(image_file, use_bounding_box)
-        return jsonify(vision_response), 200
+        # Serve repeated uploads of the same photo from the OCR cache
+        cache = get_ocr_cache()
+        image_content = image_file.read()
+        image_file.seek(0)
+        with stage('ocr_cache'):
+            digest = content_hash(image_content)
+            cache_key = options_key(options['use_bounding_box'], options['split_columns'], options['deskew_mode'])
+            vision_response, _ = cache.get(digest, cache_key)
+        
+        if vision_response is None:
+            # Process the image with Vision API
+            logger.info(f"Processing image: {image_file.filename}")
+            vision_response = detect_text(image_file, options['use_bounding_box'], options['split_columns'], options['deskew_mode'])
+            if cache.enabled and 'error' not in (vision_response.get('responses') or [{}])[0]:
+                phash = perceptual_hash(image_content) if cache.phash_distance else None
+                cache.put(digest, cache_key, vision_response, phash)
+        else:
+            logger.info(f"OCR cache hit for {image_file.filename} ({digest})")
+        
+        response = compressed_json_response(format_vision_response(vision_response, options), 200)
+        response.headers['X-Content-Hash'] = digest
+        return response
+    except DeadlineExceeded as e:
+        logger.error(f"Text detection stopped: {e}")
+        return jsonify({"error": str(e), "deadline_exceeded": True}), 504
     except Exception as e:
         logger.exception(f"Error processing image: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/vision/preflight', methods=['POST'])
+def vision_preflight():
+    """
+    Upload deduplication handshake: returns cached OCR results for an image
+    hash, or asks the client to upload the image to /api/vision/detect
+    """
+    data = request.get_json(silent=True) or request.values
+    
+    digest = data.get('content_hash')
+    if not digest or not isinstance(digest, str):
+        logger.error("No content hash provided in preflight")
+        return jsonify({"error": "No content_hash provided"}), 400
+    
+    options = read_detect_options(data)
+    cache_key = options_key(options['use_bounding_box'], options['split_columns'], options['deskew_mode'])
+    vision_response, match = get_ocr_cache().get(digest, cache_key, data.get('phash'))
+    
+    if vision_response is None:
+        return jsonify({"status": "upload_required"}), 200
+    
+    logger.info(f"Preflight {match} hit for {digest}; upload skipped")
+    return compressed_json_response({
+        "status": "hit",
+        "match": match,
+        "result": format_vision_response(vision_response, options)
+    }, 200)
+
 @app.route('/api/parse', methods=['POST'])
 def parse_menu():
     """Endpoint for parsing menu text using AI"""
@@ -70,14 +243,15 @@ def parse_menu():
         
         # Log the result in a clean, formatted way - each object on a single line
         if isinstance(parsed_result, list):
-            formatted_result = "[\n"
-            for item in parsed_result:
-                formatted_result += f"  {json.dumps(item, ensure_ascii=False)},\n"
-            formatted_result = formatted_result.rstrip(",\n") + "\n]"
-            logger.info(f"\n=== AI PARSED RESPONSE ===\n{formatted_result}\n=========================")
+            with stage('result_logging'):
+                formatted_result = "[\n"
+                for item in parsed_result:
+                    formatted_result += f"  {json.dumps(item, ensure_ascii=False)},\n"
+                formatted_result = formatted_result.rstrip(",\n") + "\n]"
+                logger.info(f"\n=== AI PARSED RESPONSE ===\n{formatted_result}\n=========================")
         
         # Return the raw parsed result without additional formatting
-        return jsonify({"result": parsed_result}), 200
+        return jsonify(add_incomplete_work({"result": parsed_result})), 200
     except Exception as e:
         logger.exception(f"Error parsing menu: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -102,7 +276,7 @@ def translate():
         if translated_text and isinstance(translated_text, str) and not translated_text.startswith('Translation failed'):
             logger.info(f"\n=== TRANSLATED TEXT ===\n{translated_text}\n======================")
         
-        return jsonify({"translated_text": translated_text}), 200
+        return jsonify(add_incomplete_work({"translated_text": translated_text})), 200
     except Exception as e:
         logger.exception(f"Error translating text: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,178 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+# Overall time budget per request in seconds; 0 means no deadline unless the client sends one
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 0))
+# Time kept back from the budget to assemble and send the (partial) response
+DEADLINE_RESPONSE_MARGIN_SECONDS = float(os.environ.get('DEADLINE_RESPONSE_MARGIN_SECONDS', 0.5))
+
+# Clients may shorten (never extend past the configured budget) the deadline per request
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+_active_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's deadline passes before a stage or upstream call finishes"""
+
+
+class RequestDeadline:
+    """
+    A request's deadline plus the work left unfinished (cut off by the
+    deadline or failed upstream).
+
+    Shared (through copied contexts) with the parse worker threads and hedged
+    upstream attempts, so they all see the same expiry and report into one list.
+    A budget of None never expires and only collects the unfinished work.
+    """
+
+    def __init__(self, budget_seconds):
+        self.budget_seconds = budget_seconds
+        self.expires_at = (time.monotonic() + max(0.0, budget_seconds - DEADLINE_RESPONSE_MARGIN_SECONDS)
+                           if budget_seconds is not None else None)
+        self.incomplete = []
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        return self.expires_at - time.monotonic() if self.expires_at is not None else None
+
+    def add_incomplete(self, stage_name, index, text, reason='deadline'):
+        with self.lock:
+            self.incomplete.append({'stage': stage_name, 'index': index, 'text': text, 'reason': reason})
+
+
+def set_deadline(budget_seconds):
+    """
+    Starts a deadline for the current context
+
+    Args:
+        budget_seconds (float): Time budget from now, or None to only collect
+            unfinished work
+
+    Returns:
+        contextvars.Token: Pass to reset_deadline when the request ends
+    """
+    return _active_deadline.set(RequestDeadline(budget_seconds))
+
+
+def reset_deadline(token):
+    _active_deadline.reset(token)
+
+
+def current_deadline():
+    """Returns the active RequestDeadline, or None when the request has no deadline"""
+    return _active_deadline.get()
+
+
+def remaining_time():
+    """
+    Seconds left before the current deadline
+
+    Returns:
+        float or None: Remaining seconds (may be negative), or None without a deadline
+    """
+    deadline = _active_deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def check_deadline(stage_name=''):
+    """Raises DeadlineExceeded if the current deadline has passed"""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded{' before ' + stage_name if stage_name else ''}")
+
+
+def timeout_for(default=None):
+    """
+    Timeout for a blocking call: the smaller of `default` and the time remaining
+
+    Args:
+        default (float): The call's own timeout (None for none)
+
+    Returns:
+        float or None: Seconds, or None if neither bounds the call
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    return min(default, remaining) if default else remaining
+
+
+def record_incomplete(stage_name, index, text, reason='deadline'):
+    """
+    Notes a piece of work (e.g. a parse chunk) that was cut off by the deadline
+    or failed upstream
+
+    Args:
+        stage_name (str): 'parse' or 'translate'
+        index (int): Position of the chunk or item in its stage
+        text (str): The unprocessed input, so the client can retry it
+        reason (str): 'deadline' or 'failed'
+    """
+    deadline = _active_deadline.get()
+    if deadline is not None:
+        deadline.add_incomplete(stage_name, index, text, reason)
+
+
+def incomplete_work():
+    """Returns the work recorded as unfinished in the current context"""
+    deadline = _active_deadline.get()
+    if deadline is None:
+        return []
+    with deadline.lock:
+        return list(deadline.incomplete)
+
+
+def requested_budget(request):
+    """
+    Reads the request's time budget from the X-Request-Timeout header or config
+
+    Args:
+        request: The Flask request
+
+    Returns:
+        float: Budget in seconds, 0 for no deadline
+    """
+    budget = REQUEST_DEADLINE_SECONDS
+    header = request.headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            requested = float(header)
+        except ValueError:
+            logger.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {header}")
+        else:
+            if requested > 0:
+                budget = min(budget, requested) if budget else requested
+    return budget
+
+
+def install_deadlines(app):
+    """
+    Registers request hooks that start and clear the per-request deadline
+
+    Args:
+        app: The Flask app
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_deadline():
+        # Without a budget the deadline never expires but still collects failed work
+        budget = requested_budget(request)
+        g.deadline_token = set_deadline(budget if budget > 0 else None)
+
+    @app.teardown_request
+    def clear_deadline(error=None):
+        token = g.pop('deadline_token', None)
+        if token is not None:
+            reset_deadline(token)
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+import contextlib
+import contextvars
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Profiling is only installed when enabled in config; otherwise the request path is untouched
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+# Optional shared secret; when set, the flag must carry this value instead of "1"/"true"
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+# 'sampling' (folded stacks for flame graphs) or 'deterministic' (cProfile)
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'sampling').lower()
+SAMPLE_INTERVAL_SECONDS = float(os.environ.get('PROFILING_SAMPLE_INTERVAL_MS', 5)) / 1000.0
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = 'profile'
+
+# Profiles live in the artifact area, in a subfolder the vision service does not clean
+PROFILES_DIR = os.path.join(os.environ.get('TEMP_IMAGES_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'temp_images'), 'profiles')
+
+_active_recorder = contextvars.ContextVar('profile_recorder', default=None)
+_no_stage = contextlib.nullcontext()
+
+
+class ProfileRecorder:
+    """
+    Collects stage spans and, in sampling mode, stack samples for one request
+    """
+
+    def __init__(self, profile_id, mode=None, interval=None):
+        self.profile_id = profile_id
+        self.mode = mode or PROFILING_MODE
+        self.interval = interval or SAMPLE_INTERVAL_SECONDS
+        self.started = time.perf_counter()
+        self.spans = []
+        self.samples = Counter()
+        self.threads = {threading.get_ident()}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.sampler = None
+        self.profiler = None
+
+    def start(self):
+        if self.mode == 'deterministic':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = threading.Thread(target=self._sample, name=f'profiler-{self.profile_id}', daemon=True)
+            self.sampler.start()
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+        if self.sampler:
+            self.stopping.set()
+            self.sampler.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _sample(self):
+        while not self.stopping.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                threads = list(self.threads)
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def add_span(self, name, start, end):
+        with self.lock:
+            self.threads.add(threading.get_ident())
+            self.spans.append({
+                'stage': name,
+                'thread': threading.current_thread().name,
+                'start_ms': round((start - self.started) * 1000, 2),
+                'duration_ms': round((end - start) * 1000, 2)
+            })
+
+    def write(self, request_path):
+        """
+        Writes the profile and stage summary to PROFILES_DIR
+
+        Returns:
+            dict: Paths of the files written
+        """
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        base = os.path.join(PROFILES_DIR, f"profile_{int(time.time())}_{self.profile_id}")
+        paths = {}
+
+        if self.profiler:
+            paths['profile'] = base + '.prof'
+            self.profiler.dump_stats(paths['profile'])
+        else:
+            # Collapsed-stack format, readable by flamegraph.pl and speedscope
+            paths['profile'] = base + '.folded'
+            with open(paths['profile'], 'w', encoding='utf-8') as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        totals = {}
+        for span in self.spans:
+            total = totals.setdefault(span['stage'], {'count': 0, 'total_ms': 0.0})
+            total['count'] += 1
+            total['total_ms'] = round(total['total_ms'] + span['duration_ms'], 2)
+
+        summary = {
+            'profile_id': self.profile_id,
+            'path': request_path,
+            'mode': self.mode,
+            'duration_ms': round(self.duration * 1000, 2),
+            'stages': totals,
+            'spans': self.spans,
+        }
+        if self.profiler:
+            summary['top_functions'] = top_functions(self.profiler)
+        else:
+            summary['samples'] = sum(self.samples.values())
+
+        paths['stages'] = base + '_stages.json'
+        with open(paths['stages'], 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        return paths
+
+
+def top_functions(profiler, limit=20):
+    """Returns the functions with the highest cumulative time from a cProfile run"""
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, calls, _, cumulative, _) in stats.stats.items():
+        rows.append({'function': f"{name} ({os.path.basename(filename)}:{line})",
+                     'calls': calls, 'cumulative_ms': round(cumulative * 1000, 2)})
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:limit]
+
+
+def stage(name):
+    """
+    Marks a pipeline stage for the request profile, e.g. `with stage('deskew'):`
+
+    Returns a shared no-op context manager when the request is not being profiled.
+    """
+    recorder = _active_recorder.get()
+    if recorder is None:
+        return _no_stage
+    return _stage_span(recorder, name)
+
+
+@contextlib.contextmanager
+def _stage_span(recorder, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add_span(name, start, time.perf_counter())
+
+
+def profiling_requested(request):
+    """
+    Checks the per-request profiling flag (X-Profile header or ?profile= query)
+
+    Args:
+        request: The Flask request
+
+    Returns:
+        bool: True if this request should be profiled
+    """
+    flag = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_PARAM)
+    if not flag:
+        return False
+    if PROFILING_TOKEN:
+        return flag == PROFILING_TOKEN
+    return flag.lower() in ('1', 'true')
+
+
+def install_profiling(app):
+    """
+    Registers request hooks that profile flagged requests
+
+    Only called when PROFILING_ENABLED is set, so unflagged deployments pay nothing.
+
+    Args:
+        app: The Flask app
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_profile():
+        if not profiling_requested(request):
+            return
+        recorder = ProfileRecorder(uuid.uuid4().hex[:12])
+        g.profile_recorder = recorder
+        g.profile_token = _active_recorder.set(recorder)
+        recorder.start()
+
+    @app.after_request
+    def tag_profile(response):
+        recorder = g.get('profile_recorder')
+        if recorder is not None:
+            response.headers['X-Profile-Id'] = recorder.profile_id
+        return response
+
+    @app.teardown_request
+    def finish_profile(error=None):
+        recorder = g.pop('profile_recorder', None)
+        if recorder is None:
+            return
+        recorder.stop()
+        _active_recorder.reset(g.pop('profile_token'))
+        try:
+            paths = recorder.write(request.path)
+            logger.info(f"Request profile written to {paths['profile']} (stages: {paths['stages']})")
+        except Exception as e:
+            logger.error(f"Error writing request profile: {e}")
+
+    logger.info(f"Per-request profiling enabled ({PROFILING_MODE} mode)")
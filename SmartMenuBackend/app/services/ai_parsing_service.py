@@ -1,20 +1,33 @@
 import os
-import requests
 import json
 import re
 import time
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from app.services.rate_limiter import get_limiter
+from app.services.hedging import get_hedged_caller, register_fallback
+from app.profiling import stage
+from app.deadline import DeadlineExceeded, check_deadline, remaining_time, record_incomplete
 
 # Use environment variable for API key
 API_KEY = os.environ.get('OPENAI_API_KEY')
-API_URL = 'https://api.openai.com/v1/chat/completions'
+API_URL = os.environ.get('OPENAI_API_URL', 'https://api.openai.com/v1/chat/completions')
 
 # Constants for chunking
 MAX_CHUNK_LENGTH = 2500  # Characters per chunk
 MAX_TOKENS = 2000  # Max tokens per response
 
+# Layout column boundary emitted by the vision service; each column is parsed separately
+COLUMN_BREAK_CHAR = '\f'
+# Upper bound on chunks parsed concurrently (the OpenAI limiter may admit fewer)
+MAX_PARALLEL_CHUNKS = int(os.environ.get('MAX_PARALLEL_CHUNKS', 4))
+
+# Price (or slash-separated prices) at the end of a line, for the rule-based fallback parser
+TRAILING_PRICES = re.compile(r'(\d+(?:\s*/\s*\d+)*)\s*(?:บาท|฿|\.-|-)?\s*$')
+
 # Define the path for temp images/logs
-TEMP_IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'temp_images')
+TEMP_IMAGES_DIR = os.environ.get('TEMP_IMAGES_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'temp_images')
 logger = logging.getLogger(__name__)
 
 def parse_menu_with_ai(text, use_accurate_model=False):
@@ -26,20 +39,29 @@ def parse_menu_with_ai(text, use_accurate_model=False):
         use_accurate_model (bool): Whether to use the more accurate but slower model
         
     Returns:
-        list: The structured menu data as a list of dictionaries
+        list: The structured menu data as a list of dictionaries. If the request
+              deadline passes, the items parsed so far (unfinished chunks are
+              recorded with app.deadline.record_incomplete)
     """
     try:
         # Skip if no text is available
         if not text:
             return 'No text to parse'
             
-        # Check if text is too long and needs chunking
+        # Check if text is too long or has several layout columns and needs chunking
         if len(text) > MAX_CHUNK_LENGTH:
             print(f"Text is {len(text)} characters, exceeding {MAX_CHUNK_LENGTH}. Using chunked processing.")
             return process_large_menu(text, use_accurate_model)
+        if COLUMN_BREAK_CHAR in text:
+            print("Text has multiple layout columns. Using chunked processing.")
+            return process_large_menu(text, use_accurate_model)
         
         return process_menu_chunk(text, use_accurate_model)
     
+    except DeadlineExceeded as e:
+        print(f"AI parsing stopped: {e}")
+        record_incomplete('parse', 0, text)
+        return []
     except Exception as e:
         print(f"Error during AI parsing: {e}")
         return f'AI parsing failed: {str(e)}'
@@ -158,30 +180,42 @@ def process_menu_chunk(chunk_text, use_accurate_model=False):
                 Output ONLY the JSON array.
             """
             
-        response = requests.post(
-            API_URL,
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {API_KEY}'
-            },
-            json={
-                "model": model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Parse this Thai menu text into structured JSON:\n{preprocessed_text}"
-                    }
-                ],
-                "temperature": 0.3,
-                "max_tokens": MAX_TOKENS
-            }
-        )
-
-        data = response.json()
+        user_prompt = f"Parse this Thai menu text into structured JSON:\n{preprocessed_text}"
+        limiter = get_limiter('openai')
+        with stage('openai_api'):
+            # Hedged against slow completions. The fallback parser (if configured) gets the raw
+            # chunk text: preprocessing drops short lines such as bare prices
+            outcome, source = get_hedged_caller('openai').call(lambda: limiter.post(
+                API_URL,
+                tokens=estimate_tokens(system_prompt + user_prompt),
+                headers={
+                    'Content-Type': 'application/json',
+                    'Authorization': f'Bearer {API_KEY}'
+                },
+                json={
+                    "model": model,
+                    "messages": [
+                        {
+                            "role": "system",
+                            "content": system_prompt
+                        },
+                        {
+                            "role": "user",
+                            "content": user_prompt
+                        }
+                    ],
+                    "temperature": 0.3,
+                    "max_tokens": MAX_TOKENS
+                }
+            ), fallback_args=(chunk_text,))
+            if source == 'fallback':
+                return outcome
+            response, reserved_tokens = outcome
+            data = response.json()
+
+        # Feed the real usage back into the token budget
+        if 'usage' in data:
+            limiter.record_usage(reserved_tokens, data['usage'].get('total_tokens'))
 
         if 'error' in data:
             print(f"AI parsing API error: {data.get('error')}")
@@ -243,50 +277,108 @@ def process_menu_chunk(chunk_text, use_accurate_model=False):
                     clean_json = result_cleaned.replace("```json", "").replace("```", "").strip()
                     parsed_json = json.loads(clean_json)
                     return parsed_json
-                return []
+                return f'AI parsing failed: invalid JSON in the response ({json_err})'
             except:
                 print("Secondary JSON parsing also failed")
-                return []
+                return f'AI parsing failed: invalid JSON in the response ({json_err})'
     
+    except DeadlineExceeded:
+        # The caller decides what to do with a chunk cut off by the deadline
+        raise
     except Exception as e:
         print(f"Error during chunk processing: {e}")
         import traceback
         traceback.print_exc()
-        return []
+        return f'AI parsing failed: {str(e)}'
+
+def estimate_tokens(prompt):
+    """
+    Estimates the token cost of a chat completion before it is sent
+    
+    Args:
+        prompt (str): The full prompt text (system + user)
+        
+    Returns:
+        int: Estimated prompt tokens plus the completion allowance
+    """
+    # Thai script tokenizes to roughly one token per character, so count characters.
+    # OpenAI charges max_tokens against the TPM limit up front as well.
+    return len(prompt) + MAX_TOKENS
 
 def process_large_menu(text, use_accurate_model=False):
     """
-    Process a large menu by splitting it into chunks
+    Process a large menu by splitting it into chunks and parsing them in parallel
+    
+    Each layout column (separated by a form feed) starts a new chunk, so
+    unrelated columns are never mixed in one prompt.
     
     Args:
         text (str): The full menu text
         use_accurate_model (bool): Whether to use the more accurate but slower model
         
     Returns:
-        list: The combined parsed menu items from all chunks
+        list: The combined parsed menu items from all chunks, in menu order.
+              Chunks not finished by the request deadline, or whose parse
+              failed, are left out and recorded as incomplete. If every chunk
+              failed, the first chunk's failure message (str).
     """
-    # Preprocess text first
-    preprocessed_text = preprocess_menu_text(text)
-    
-    # Split text into chunks at appropriate boundaries (end of lines)
-    chunks = split_text_into_chunks(preprocessed_text, MAX_CHUNK_LENGTH)
+    # Split text into chunks at column boundaries, then at line boundaries. Chunks keep
+    # the raw text (each is preprocessed when parsed) for the fallback parser and retries;
+    # chunks with nothing left after preprocessing are skipped.
+    chunks = []
+    for column_text in text.split(COLUMN_BREAK_CHAR):
+        chunks.extend(chunk for chunk in split_text_into_chunks(column_text.strip('\n'), MAX_CHUNK_LENGTH)
+                      if preprocess_menu_text(chunk))
     
     print(f"Split menu into {len(chunks)} chunks")
+    if not chunks:
+        return []
     
-    # Process each chunk
-    all_results = []
-    for i, chunk in enumerate(chunks):
+    # Process the chunks concurrently; results come back in chunk order
+    def process_numbered_chunk(numbered_chunk):
+        i, chunk = numbered_chunk
+        # A chunk still queued when the deadline passes is not started at all
+        check_deadline('parsing chunk')
         print(f"Processing chunk {i+1}/{len(chunks)}")
-        chunk_result = process_menu_chunk(chunk, use_accurate_model)
-        
-        # Skip failed chunks
+        return process_menu_chunk(chunk, use_accurate_model)
+    
+    # Each task runs in a copy of the caller's context so request-scoped state
+    # (such as the active profile and deadline) follows the chunk into its worker thread
+    executor = ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL_CHUNKS, len(chunks))))
+    futures = [executor.submit(contextvars.copy_context().run, process_numbered_chunk, numbered_chunk)
+               for numbered_chunk in enumerate(chunks)]
+    remaining = remaining_time()
+    wait(futures, timeout=max(0.0, remaining) if remaining is not None else None)
+    # Queued chunks are cancelled. Chunks still running make no new upstream call: the
+    # limiter refuses to send after the deadline and the request in flight times out at
+    # it. OpenAI may still bill a completion that was already sent.
+    executor.shutdown(wait=False, cancel_futures=True)
+    
+    chunk_results = []
+    for i, future in enumerate(futures):
+        if not future.done() or future.cancelled() or isinstance(future.exception(), DeadlineExceeded):
+            print(f"Chunk {i+1}/{len(chunks)} not finished before the deadline")
+            record_incomplete('parse', i, chunks[i])
+        else:
+            chunk_results.append((i, future.result()))
+    
+    all_results = []
+    failures = []
+    for i, chunk_result in chunk_results:
+        # Failed chunks are left out but reported, so they can be parsed again
         if isinstance(chunk_result, str) and chunk_result.startswith('AI parsing failed'):
+            print(f"Chunk {i+1}/{len(chunks)} failed: {chunk_result}")
+            record_incomplete('parse', i, chunks[i], reason='failed')
+            failures.append(chunk_result)
             continue
             
         # Add chunk results to overall results
         if isinstance(chunk_result, list):
             all_results.extend(chunk_result)
     
+    if failures and len(failures) == len(chunks):
+        return failures[0]
+    
     print(f"Completed processing {len(chunks)} chunks, extracted {len(all_results)} menu items")
     
     return all_results
@@ -323,4 +415,50 @@ def split_text_into_chunks(text, max_length):
     if current_chunk:
         chunks.append(current_chunk)
     
-    return chunks 
\ No newline at end of file
+    return chunks 
+
+def parse_menu_with_rules(text):
+    """
+    Parses menu text without the AI, pairing each line with its trailing price
+    
+    A much rougher parse than the model's, used as the OpenAI fallback backend
+    (OPENAI_FALLBACK=rules) when a completion is too slow or fails. Lines without
+    a price are only kept when the next line is a bare price; otherwise they are
+    treated as headings.
+    
+    Args:
+        text (str): The menu text
+        
+    Returns:
+        list: Menu items as {"name": ..., "price": ...} dictionaries
+    """
+    items = []
+    pending_name = None
+    # Not preprocess_menu_text: its noise filter would drop short bare prices such as "45"
+    for line in text.replace(COLUMN_BREAK_CHAR, '\n').split('\n'):
+        line = re.sub(r'\s+', ' ', line).strip()
+        if not line:
+            continue
+        match = TRAILING_PRICES.search(line)
+        name = (line[:match.start()] if match else line).strip(' .:-')
+        if not match:
+            pending_name = name
+            continue
+        
+        if not name:
+            # A bare price completes the name on the previous line
+            name, pending_name = pending_name, None
+            if not name:
+                continue
+        pending_name = None
+        
+        prices = [int(price) for price in re.split(r'\s*/\s*', match.group(1))]
+        names = [part.strip() for part in name.split('/')]
+        # Different prices for slash-separated names are separate items
+        if len(prices) > 1 and len(names) == len(prices):
+            items.extend({"name": n, "price": p} for n, p in zip(names, prices))
+        else:
+            items.append({"name": name, "price": prices[0]})
+    return items
+
+register_fallback('openai', 'rules', parse_menu_with_rules)
@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import logging
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Curated dish datasets shared with the mobile app (thai_script -> english_name).
+# Earlier files win when the same dish appears in several datasets.
+DATASET_DIR = os.environ.get('DISH_DATASET_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'SmartMenuApp', 'src', 'dataset'
+)
+DATASET_FILES = ['kaggle_dishes.json', 'wiki_dishes.json']
+
+# Proteins and other common add-ons written after (or before) a dish name,
+# e.g. กะเพรา + หมูสับ. Matched longest first.
+PROTEINS = {
+    'หมูสับ': 'Minced Pork',
+    'หมูกรอบ': 'Crispy Pork',
+    'หมูแดง': 'Red Roast Pork',
+    'หมูสามชั้น': 'Pork Belly',
+    'หมูชิ้น': 'Sliced Pork',
+    'หมูป่า': 'Wild Boar',
+    'หมู': 'Pork',
+    'ไก่สับ': 'Minced Chicken',
+    'ไก่': 'Chicken',
+    'เนื้อสับ': 'Minced Beef',
+    'เนื้อ': 'Beef',
+    'เป็ด': 'Duck',
+    'กุ้ง': 'Shrimp',
+    'ปลาหมึก': 'Squid',
+    'หมึก': 'Squid',
+    'ทะเล': 'Seafood',
+    'รวมมิตร': 'Mixed Meat',
+    'ปู': 'Crab',
+    'หอย': 'Shellfish',
+    'ปลา': 'Fish',
+    'ไข่ดาว': 'Fried Egg',
+    'ไข่': 'Egg',
+    'เต้าหู้': 'Tofu',
+    'ผัก': 'Vegetables',
+}
+
+# Common spelling variants, mapped to the form used in the datasets
+SPELLING_VARIANTS = {
+    'กระเพรา': 'กะเพรา',
+    'กระเพา': 'กะเพรา',
+    'กะเพา': 'กะเพรา',
+}
+
+# Short names menus use for a dataset dish
+DISH_ALIASES = {
+    'กะเพรา': 'ผัดกะเพรา',
+}
+
+ALTERNATIVE_SEPARATORS = re.compile(r'\s*[/,]\s*')
+IGNORED_CHARACTERS = re.compile(r'[\s\u200b\u200c\u200d\ufeff.\-_()\[\]"\'*:;]+')
+
+
+def normalize_name(name):
+    """
+    Normalizes a dish name for lookup: NFC, lower-case, spelling variants
+    unified, and whitespace, zero-width characters and punctuation removed.
+    Alternative separators ('/' and ',') are kept.
+
+    Args:
+        name (str): The dish name
+
+    Returns:
+        str: The normalized key
+    """
+    key = unicodedata.normalize('NFC', name).lower()
+    key = IGNORED_CHARACTERS.sub('', ALTERNATIVE_SEPARATORS.sub('/', key))
+    for variant, canonical in SPELLING_VARIANTS.items():
+        key = key.replace(variant, canonical)
+    return key.strip('/')
+
+
+class DishIndex:
+    """
+    In-memory index from normalized Thai dish names to curated English names
+    """
+
+    def __init__(self, entries):
+        self.names = {}
+        for thai_script, english_name in entries:
+            key = normalize_name(thai_script)
+            if key and english_name and key not in self.names:
+                self.names[key] = english_name.strip()
+        self.proteins = sorted(((normalize_name(k), v) for k, v in PROTEINS.items()), key=lambda p: -len(p[0]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _base(self, key):
+        """Looks up a base dish by its key or a known alias"""
+        return self.names.get(key) or self.names.get(DISH_ALIASES.get(key))
+
+    def _proteins(self, text):
+        """Parses 'หมูสับ/ไก่' into ['Minced Pork', 'Chicken'], or None if any part is unknown"""
+        parts = [part for part in text.split('/') if part]
+        if not parts:
+            return None
+        english = []
+        for part in parts:
+            match = next((name for thai, name in self.proteins if part == thai), None)
+            if match is None:
+                return None
+            english.append(match)
+        return english
+
+    def lookup(self, name):
+        """
+        Translates a dish name locally when it is known
+
+        Tries an exact (normalized) match, then a known dish followed or
+        preceded by one or more proteins, e.g. กะเพราหมูสับ/ไก่.
+
+        Args:
+            name (str): The Thai dish name
+
+        Returns:
+            str or None: The English name, or None if the dish is unknown
+        """
+        if not isinstance(name, str):
+            return None
+        key = normalize_name(name)
+        if not key:
+            return None
+
+        base = self._base(key)
+        if base:
+            return base
+
+        # Known dish + protein suffix (longest dish first)
+        for split in range(len(key) - 1, 0, -1):
+            base = self._base(key[:split])
+            if base:
+                proteins = self._proteins(key[split:])
+                if proteins:
+                    return f"{base} with {' or '.join(proteins)}"
+
+        # Protein prefix + known dish, e.g. หมูกรอบผัดกะเพรา
+        for thai, english in self.proteins:
+            if key.startswith(thai):
+                base = self._base(key[len(thai):])
+                if base:
+                    return f"{base} with {english}"
+        return None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def load_dish_index(dataset_dir=None):
+    """
+    Builds a DishIndex from the dataset JSON files
+
+    Missing files are skipped, so a backend deployed without the datasets
+    simply sends every name to the translation API.
+
+    Args:
+        dataset_dir (str): Folder holding the dataset files (defaults to DATASET_DIR)
+
+    Returns:
+        DishIndex: The index
+    """
+    dataset_dir = dataset_dir or DATASET_DIR
+    entries = []
+    for filename in DATASET_FILES:
+        path = os.path.join(dataset_dir, filename)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries.extend((dish.get('thai_script', ''), dish.get('english_name', '')) for dish in json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dish dataset not loaded ({path}): {e}")
+    index = DishIndex(entries)
+    logger.info(f"Dish index loaded with {len(index)} names")
+    return index
+
+
+def get_dish_index():
+    """
+    Returns the process-wide dish index, loading it on first use
+
+    Returns:
+        DishIndex: The shared index
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = load_dish_index()
+        return _index
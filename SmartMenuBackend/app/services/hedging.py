@@ -0,0 +1,295 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from app.deadline import DeadlineExceeded, remaining_time
+from app.services.rate_limiter import CallProgress, track_progress
+
+logger = logging.getLogger(__name__)
+
+# Hedging and fallback settings per upstream. Every value can be overridden with
+# <NAME>_HEDGE (true/false), <NAME>_HEDGE_PERCENTILE, <NAME>_BUDGET_SECONDS and
+# <NAME>_FALLBACK (the name of a registered fallback backend) environment variables.
+# Hedging is off by default because every hedge is a second paid upstream call.
+DEFAULT_HEDGING = {
+    'openai': {'hedge': False, 'hedge_percentile': 95, 'budget_seconds': 0, 'fallback': ''},
+    'vision': {'hedge': False, 'hedge_percentile': 95, 'budget_seconds': 0, 'fallback': ''},
+    'translate': {'hedge': False, 'hedge_percentile': 95, 'budget_seconds': 0, 'fallback': ''},
+}
+
+# Latencies of recent successful attempts that the hedge delay is estimated from
+LATENCY_WINDOW = 200
+# No hedging until this many latencies have been observed
+MIN_LATENCY_SAMPLES = 20
+# Never hedge sooner than this, however fast the upstream usually is
+MIN_HEDGE_DELAY_SECONDS = 0.2
+# Threads running hedged attempts (shared by all upstreams in the process)
+HEDGE_POOL_SIZE = int(os.environ.get('HEDGE_POOL_SIZE', 32))
+# How often to check whether a primary still queued in its limiter has been sent
+HEDGE_POLL_SECONDS = 0.05
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix='hedge')
+        return _executor
+
+
+class UpstreamError(Exception):
+    """
+    An attempt was answered with a non-2xx response.
+
+    Raised inside the attempt so the caller keeps waiting for the other
+    attempts and then tries the fallback. `result` is the attempt's return
+    value, handed back to the caller when there is nothing else to try.
+    """
+
+    def __init__(self, result, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.result = result
+
+
+class LatencyTracker:
+    """
+    Thread-safe rolling window of upstream latencies
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct):
+        """
+        Returns the pct-th percentile of the window
+
+        Returns:
+            float or None: Seconds, or None until MIN_LATENCY_SAMPLES have been seen
+        """
+        with self.lock:
+            if len(self.samples) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+class HedgedCaller:
+    """
+    Runs upstream calls with an optional hedge and fallback.
+
+    If the call has not answered by the observed hedge percentile of the
+    upstream's HTTP round trips, one duplicate is sent and whichever answers
+    first is used. The delay counts from when the primary went on the wire:
+    a primary still queued in its limiter or backing off after a 429 is not
+    hedged. If neither attempt has answered within the budget, or both fail
+    (non-2xx responses included), the fallback runs instead. Waiting also
+    stops at the request's deadline (see app.deadline).
+    """
+
+    def __init__(self, name, hedge=False, hedge_percentile=95, budget_seconds=0, fallback=None):
+        self.name = name
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.budget_seconds = budget_seconds
+        self.fallback = fallback
+        self.latency = LatencyTracker()
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'hedged': 0, 'primary_wins': 0, 'hedge_wins': 0,
+                      'fallbacks': 0, 'failures': 0}
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None when hedging is off or not yet calibrated"""
+        if not self.hedge:
+            return None
+        observed = self.latency.percentile(self.hedge_percentile)
+        if observed is None:
+            return None
+        return max(MIN_HEDGE_DELAY_SECONDS, observed)
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _timed(self, attempt, progress):
+        start = time.perf_counter()
+        with track_progress(progress):
+            result = attempt()
+        response = result[0] if isinstance(result, tuple) else result
+        if isinstance(response, requests.Response) and not 200 <= response.status_code < 300:
+            raise UpstreamError(result, response.status_code)
+        # Only the HTTP round trip is a sample of the upstream's latency, not time
+        # spent queued in the limiter or sleeping out a Retry-After
+        self.latency.record(progress.round_trip if progress.round_trip is not None else time.perf_counter() - start)
+        return result
+
+    def _submit(self, attempt, progress):
+        # Attempts run in a copy of the caller's context so stage spans still reach the request profile
+        return _get_executor().submit(contextvars.copy_context().run, self._timed, attempt, progress)
+
+    def _run_fallback(self, fallback_args, error=None):
+        self._count('fallbacks')
+        logger.warning(f"{self.name} over budget or failing ({error or 'no answer'}); using fallback {self.fallback.__name__}")
+        return self.fallback(*fallback_args), 'fallback'
+
+    def call(self, attempt, fallback_args=None):
+        """
+        Runs `attempt` with hedging and the configured fallback
+
+        Args:
+            attempt (callable): Zero-argument function making one upstream call
+                (typically a limiter post). It may be invoked twice.
+            fallback_args (tuple): Arguments for the fallback backend; None
+                disables the fallback for this call
+
+        Returns:
+            tuple: (result, source) where source is 'primary', 'hedge' or
+                'fallback' (a fallback result has the fallback's own shape).
+                Without a fallback, a failed call returns the last error
+                response like a successful one.
+        """
+        self._count('calls')
+        fallback_enabled = self.fallback is not None and fallback_args is not None
+        delay = self.hedge_delay()
+
+        # Nothing to race against: call inline on the caller's thread
+        if delay is None and not (fallback_enabled and self.budget_seconds):
+            try:
+                result = self._timed(attempt, CallProgress())
+                self._count('primary_wins')
+                return result, 'primary'
+            except Exception as e:
+                self._count('failures')
+                if fallback_enabled:
+                    return self._run_fallback(fallback_args, e)
+                if isinstance(e, UpstreamError):
+                    return e.result, 'primary'
+                raise
+
+        start = time.monotonic()
+        budget_at = start + self.budget_seconds if fallback_enabled and self.budget_seconds else None
+        primary = CallProgress()
+        pending = {self._submit(attempt, primary): 'primary'}
+        hedge_pending = delay is not None
+        error = None
+
+        remaining = remaining_time()
+        deadline_at = start + remaining if remaining is not None else None
+
+        while pending:
+            now = time.monotonic()
+            timeouts = [at - now for at in (budget_at, deadline_at) if at is not None]
+            if hedge_pending:
+                # Hedge `delay` after the primary went on the wire; poll while it is queued
+                sent_at = primary.sent_at
+                timeouts.append(sent_at + delay - now if sent_at is not None else HEDGE_POLL_SECONDS)
+            done, _ = wait(pending, timeout=max(0.0, min(timeouts)) if timeouts else None,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                role = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self._count(f'{role}_wins')
+                if role == 'hedge':
+                    logger.info(f"{self.name} hedge answered first after {time.monotonic() - start:.2f}s")
+                return result, role
+
+            now = time.monotonic()
+            sent_at = primary.sent_at
+            if hedge_pending and pending and sent_at is not None and now >= sent_at + delay:
+                # One hedge at most; a primary that already failed is not hedged
+                hedge_pending = False
+                self._count('hedged')
+                pending[self._submit(attempt, CallProgress())] = 'hedge'
+            if budget_at is not None and now >= budget_at:
+                # The outstanding attempts finish in the background and are discarded
+                return self._run_fallback(fallback_args, f'no answer within {self.budget_seconds}s')
+            if deadline_at is not None and now >= deadline_at:
+                error = DeadlineExceeded(f"Deadline exceeded waiting for {self.name}")
+                break
+
+        self._count('failures')
+        if fallback_enabled:
+            return self._run_fallback(fallback_args, error)
+        if isinstance(error, UpstreamError):
+            return error.result, 'primary'
+        raise error
+
+_fallback_backends = {}
+_callers = {}
+_callers_lock = threading.Lock()
+
+
+def register_fallback(upstream, backend_name, fn):
+    """
+    Makes a fallback backend selectable with <UPSTREAM>_FALLBACK=<backend_name>
+
+    Args:
+        upstream (str): Upstream name ('openai', 'vision' or 'translate')
+        backend_name (str): Name used in config, e.g. 'rules'
+        fn (callable): Called with the fallback_args of the failed call
+    """
+    _fallback_backends[(upstream, backend_name)] = fn
+
+
+def get_hedged_caller(name):
+    """
+    Returns the process-wide hedged caller for an upstream, creating it from config on first use
+
+    Args:
+        name (str): Upstream name ('openai', 'vision' or 'translate')
+
+    Returns:
+        HedgedCaller: The shared caller
+    """
+    with _callers_lock:
+        if name not in _callers:
+            defaults = DEFAULT_HEDGING.get(name, {})
+            prefix = name.upper()
+            fallback_name = os.environ.get(f'{prefix}_FALLBACK', defaults.get('fallback', ''))
+            fallback = _fallback_backends.get((name, fallback_name)) if fallback_name else None
+            if fallback_name and fallback is None:
+                logger.error(f"Unknown {name} fallback backend '{fallback_name}'; fallback disabled")
+            _callers[name] = HedgedCaller(
+                name,
+                hedge=os.environ.get(f'{prefix}_HEDGE', str(defaults.get('hedge', False))).lower() == 'true',
+                hedge_percentile=float(os.environ.get(f'{prefix}_HEDGE_PERCENTILE', defaults.get('hedge_percentile', 95))),
+                budget_seconds=float(os.environ.get(f'{prefix}_BUDGET_SECONDS', defaults.get('budget_seconds', 0))),
+                fallback=fallback,
+            )
+        return _callers[name]
+
+
+def hedging_stats():
+    """
+    Returns hedge/fallback counters and the current hedge delay per upstream
+
+    Returns:
+        dict: Stats keyed by upstream name
+    """
+    with _callers_lock:
+        callers = dict(_callers)
+    stats = {}
+    for name, caller in callers.items():
+        with caller.lock:
+            entry = dict(caller.stats)
+        delay = caller.hedge_delay()
+        entry['hedge_rate'] = round(entry['hedged'] / entry['calls'], 4) if entry['calls'] else 0.0
+        entry['hedge_delay_seconds'] = round(delay, 3) if delay is not None else None
+        entry['p50_seconds'] = caller.latency.percentile(50)
+        stats[name] = entry
+    return stats
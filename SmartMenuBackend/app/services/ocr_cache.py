@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import re
+import zlib
+import hashlib
+import tempfile
+import logging
+import threading
+
+# Optional fast path for (de)serializing cached results
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# OCR results keyed by the MD5 of the uploaded bytes (the hash expo-file-system
+# computes natively on the phone) plus the options that change the result.
+# They are kept as files so every gunicorn worker on the host shares them.
+# 0 entries disables the cache.
+OCR_CACHE_DIR = os.environ.get('OCR_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'smartmenu_ocr_cache')
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_ENTRIES', 64))
+OCR_CACHE_TTL_SECONDS = float(os.environ.get('OCR_CACHE_TTL_SECONDS', 3600))
+# Results are stored as compressed JSON (a dense menu's Vision dict takes several MB
+# as Python objects, tens of KB compressed); this bounds their total size on disk
+OCR_CACHE_MAX_BYTES = int(os.environ.get('OCR_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Perceptual matching is opt-in: menus are all dark text on light paper, so
+# small hashes of different menus can look alike. 0 disables it; otherwise the
+# maximum Hamming distance (out of PHASH_BITS) for a near-duplicate match.
+OCR_CACHE_PHASH_DISTANCE = int(os.environ.get('OCR_CACHE_PHASH_DISTANCE', 0))
+PHASH_SIZE = 16
+PHASH_BITS = PHASH_SIZE * PHASH_SIZE
+
+# Cache file names: <options>_<md5>_<phash or ->_<stored at>.ocr. Client hashes are
+# checked against these patterns before they become part of a path.
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+PHASH_PATTERN = re.compile(r'^[0-9a-f]{%d}$' % (PHASH_BITS // 4))
+CACHE_FILE_SUFFIX = '.ocr'
+
+
+def content_hash(image_bytes):
+    """Returns the hex MD5 of the raw upload, as sent by the app in a preflight"""
+    return hashlib.md5(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes):
+    """
+    Computes a difference hash (dHash) of an image
+
+    The image is reduced to a (PHASH_SIZE + 1) x PHASH_SIZE grayscale grid and
+    each bit records whether a cell is brighter than its right-hand neighbour.
+
+    Args:
+        image_bytes (bytes): The encoded image
+
+    Returns:
+        str or None: PHASH_BITS bits as hex, or None if the image cannot be decoded
+    """
+    import cv2
+    import numpy as np
+
+    # The reduced-size decode skips most of the JPEG work on large photos
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    grid = cv2.resize(image, (PHASH_SIZE + 1, PHASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (grid[:, 1:] > grid[:, :-1]).flatten()
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):0{PHASH_BITS // 4}x}"
+
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hex hashes of the same length"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def _pack(result):
+    """Serializes a detect_text result to compressed JSON"""
+    data = orjson.dumps(result) if orjson else json.dumps(result, ensure_ascii=False).encode('utf-8')
+    return zlib.compress(data, 1)
+
+
+def _unpack(payload):
+    data = zlib.decompress(payload)
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def options_key(use_bounding_box, split_columns, deskew_mode):
+    """The detect_text options that change its result, as part of the cache key"""
+    return (bool(use_bounding_box), bool(split_columns), (deskew_mode or '').lower())
+
+
+def _options_tag(options):
+    """The options_key() as a file-name-safe tag"""
+    use_bounding_box, split_columns, deskew_mode = options
+    return f"{int(use_bounding_box)}{int(split_columns)}{re.sub(r'[^a-z]', '', deskew_mode) or 'default'}"
+
+
+class OcrCache:
+    """
+    LRU of detect_text results with a TTL and an optional perceptual-hash
+    match for near-duplicate photos, shared by the worker processes.
+
+    Each result is one zlib-compressed JSON file in `directory`; the hashes
+    and store time are in its name, and its mtime is bumped on every hit.
+    The cache is bounded both by count and by total bytes. Files are written
+    atomically, so workers never read a partial entry.
+    """
+
+    def __init__(self, max_entries=OCR_CACHE_MAX_ENTRIES, ttl_seconds=OCR_CACHE_TTL_SECONDS,
+                 phash_distance=OCR_CACHE_PHASH_DISTANCE, max_bytes=OCR_CACHE_MAX_BYTES, directory=OCR_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.phash_distance = phash_distance
+        self.max_bytes = max_bytes
+        self.directory = directory
+        # Counters are per worker process
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'perceptual_hits': 0, 'misses': 0, 'stores': 0}
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def _entries(self):
+        """
+        Lists the cache files
+
+        Returns:
+            list: Dicts with path, options tag, digest, phash, stored_at, used_at and size
+        """
+        entries = []
+        try:
+            files = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return entries
+        for entry in files:
+            parts = entry.name[:-len(CACHE_FILE_SUFFIX)].split('_')
+            if not entry.name.endswith(CACHE_FILE_SUFFIX) or len(parts) != 4:
+                continue
+            try:
+                stat = entry.stat()
+                stored_at = float(parts[3])
+            except (OSError, ValueError):
+                # Removed by another worker, or not one of ours
+                continue
+            entries.append({'path': entry.path, 'options': parts[0], 'digest': parts[1],
+                            'phash': parts[2] if parts[2] != '-' else None,
+                            'stored_at': stored_at, 'used_at': stat.st_mtime, 'size': stat.st_size})
+        return entries
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _expire(self, entries, now):
+        """Deletes stale files, then the least recently used ones over the count or byte limit"""
+        live = []
+        for entry in entries:
+            if now - entry['stored_at'] > self.ttl_seconds:
+                self._remove(entry['path'])
+            else:
+                live.append(entry)
+        live.sort(key=lambda entry: entry['used_at'])
+        total_bytes = sum(entry['size'] for entry in live)
+        while live and (len(live) > self.max_entries or total_bytes > self.max_bytes):
+            entry = live.pop(0)
+            total_bytes -= entry['size']
+            self._remove(entry['path'])
+
+    def get(self, digest, options, phash=None):
+        """
+        Looks up a cached result by content hash, then by perceptual hash
+
+        Args:
+            digest (str): Hex MD5 of the image bytes
+            options (tuple): options_key() of the request
+            phash (str): Optional perceptual hash of the image
+
+        Returns:
+            tuple: (result, 'exact' | 'perceptual') or (None, None) on a miss
+        """
+        if not self.enabled:
+            return None, None
+        digest = (digest or '').lower()
+        phash = (phash or '').lower()
+        now = time.time()
+        tag = _options_tag(options)
+        entries = [e for e in self._entries() if e['options'] == tag and now - e['stored_at'] <= self.ttl_seconds]
+
+        match = next((e for e in entries if e['digest'] == digest), None)
+        if match is not None:
+            result = self._read(match['path'])
+            if result is not None:
+                self._count('hits')
+                return result, 'exact'
+
+        if PHASH_PATTERN.match(phash) and self.phash_distance > 0:
+            candidates = sorted((hamming_distance(e['phash'], phash), e['path']) for e in entries if e['phash'])
+            for distance, path in candidates:
+                if distance > self.phash_distance:
+                    break
+                result = self._read(path)
+                if result is not None:
+                    self._count('perceptual_hits')
+                    logger.info(f"OCR cache perceptual match at distance {distance}")
+                    return result, 'perceptual'
+
+        self._count('misses')
+        return None, None
+
+    def _read(self, path):
+        """Returns the result stored in a cache file and marks it used, or None if it is gone"""
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+            # Explicit times: the filesystem's own timestamps are only tick-accurate
+            now = time.time()
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            return None
+        return _unpack(payload)
+
+    def put(self, digest, options, result, phash=None):
+        """
+        Stores a detect_text result
+
+        Args:
+            digest (str): Hex MD5 of the image bytes
+            options (tuple): options_key() of the request
+            result (dict): The detect_text result
+            phash (str): Optional perceptual hash of the image
+        """
+        digest = (digest or '').lower()
+        if not self.enabled or not DIGEST_PATTERN.match(digest):
+            return
+        payload = _pack(result)
+        if len(payload) > self.max_bytes:
+            return
+        phash = phash.lower() if phash and PHASH_PATTERN.match(phash.lower()) else '-'
+        tag = _options_tag(options)
+        now = time.time()
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.utime(temp_path, (now, now))
+        path = os.path.join(self.directory, f"{tag}_{digest}_{phash}_{now:.6f}{CACHE_FILE_SUFFIX}")
+        os.replace(temp_path, path)
+        self._count('stores')
+
+        entries = self._entries()
+        # A newer copy replaces older entries for the same image and options
+        for entry in entries:
+            if entry['options'] == tag and entry['digest'] == digest and entry['path'] != path:
+                self._remove(entry['path'])
+        self._expire([e for e in entries if e['options'] != tag or e['digest'] != digest or e['path'] == path], now)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """
+    Returns the OCR result cache of this process (its files are shared)
+
+    Returns:
+        OcrCache: The shared cache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OcrCache()
+        return _cache
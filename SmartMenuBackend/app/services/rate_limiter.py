@@ -0,0 +1,385 @@
+import os
+import time
+import random
+import logging
+import threading
+import contextlib
+import contextvars
+import email.utils
+import requests
+from app.deadline import DeadlineExceeded, remaining_time, timeout_for
+
+logger = logging.getLogger(__name__)
+
+# Default budgets per upstream. A value of 0 disables that budget.
+# Every value can be overridden with <NAME>_REQUESTS_PER_MINUTE,
+# <NAME>_TOKENS_PER_MINUTE, <NAME>_MAX_CONCURRENCY and <NAME>_TIMEOUT_SECONDS
+# environment variables. The per-minute budgets are the account's quota: each
+# worker process holds its own limiter, so they are split evenly across the
+# WEB_CONCURRENCY gunicorn workers. Concurrency is per worker.
+DEFAULT_LIMITS = {
+    'openai': {'requests_per_minute': 500, 'tokens_per_minute': 60000, 'max_concurrency': 8, 'timeout_seconds': 60},
+    'vision': {'requests_per_minute': 1800, 'tokens_per_minute': 0, 'max_concurrency': 8, 'timeout_seconds': 30},
+    # For Translate the "tokens" budget is characters per minute
+    'translate': {'requests_per_minute': 600, 'tokens_per_minute': 180000, 'max_concurrency': 8, 'timeout_seconds': 15},
+}
+
+# How often a rate-limited request is re-queued before its response is handed back
+MAX_RATE_LIMIT_RETRIES = int(os.environ.get('UPSTREAM_MAX_RATE_LIMIT_RETRIES', 8))
+# Backoff used when the upstream does not send a Retry-After header
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+# Worker processes sharing the account's budgets
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+
+
+# Progress of the limiter call running in the current context, when a caller (the
+# hedging layer) watches it from another thread; see track_progress
+_call_progress = contextvars.ContextVar('limiter_call_progress', default=None)
+
+
+class CallProgress:
+    """
+    Where one limiter call is, for a caller watching it from another thread.
+
+    sent_at is the monotonic time the current HTTP attempt went on the wire,
+    or None while the call is queued in the limiter or backing off after a
+    429. round_trip is the HTTP time of the last attempt that got an answer.
+    """
+
+    def __init__(self):
+        self.sent_at = None
+        self.round_trip = None
+
+
+@contextlib.contextmanager
+def track_progress(progress):
+    """
+    Makes limiter calls in the block report into `progress`
+
+    Args:
+        progress (CallProgress): The object to update
+    """
+    token = _call_progress.set(progress)
+    try:
+        yield progress
+    finally:
+        _call_progress.reset(token)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute / 60` tokens per second
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """
+        Blocks until `amount` tokens are available and consumes them
+
+        Args:
+            amount (float): Number of tokens to take. Clamped to the bucket capacity
+                so a single oversized request can still go through.
+        """
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0, _time_left()))
+
+    def adjust(self, delta):
+        """
+        Returns (positive delta) or charges (negative delta) tokens after the fact.
+        The balance may go negative, which delays later acquirers.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class UpstreamLimiter:
+    """
+    Per-upstream limiter combining request/token budgets with an AIMD concurrency window.
+
+    Callers are queued (blocked) until a concurrency slot and budget are available.
+    A 429 halves the window and pauses the upstream for its Retry-After; each
+    success grows the window again by roughly one slot per window's worth of calls.
+    The window is halved at most once per congestion event: 429s for requests
+    sent before the last decrease only extend the pause.
+    """
+
+    def __init__(self, name, requests_per_minute=0, tokens_per_minute=0, max_concurrency=8, min_concurrency=1,
+                 timeout=None):
+        self.name = name
+        # Per-attempt requests timeout in seconds (None waits indefinitely)
+        self.timeout = timeout or None
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = float('-inf')
+        self.condition = threading.Condition()
+        self.stats = {'requests': 0, 'rate_limited': 0, 'retries': 0}
+
+    def acquire(self, tokens=0):
+        """
+        Waits for a concurrency slot and the request/token budgets
+
+        Args:
+            tokens (float): Estimated token cost of the call
+
+        Returns:
+            float: The number of tokens actually reserved
+        """
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.concurrency):
+                    break
+                self.condition.wait(timeout=min(pause if pause > 0 else 1.0, _time_left()))
+            self.in_flight += 1
+            self.stats['requests'] += 1
+
+        try:
+            if self.request_bucket:
+                self.request_bucket.acquire(1)
+            reserved = 0
+            if self.token_bucket and tokens:
+                reserved = min(float(tokens), self.token_bucket.capacity)
+                self.token_bucket.acquire(reserved)
+            return reserved
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record_usage(self, reserved_tokens, actual_tokens):
+        """
+        Reconciles a reservation with the usage reported by the upstream
+
+        Args:
+            reserved_tokens (float): Tokens reserved by `acquire`
+            actual_tokens (float): Tokens the upstream reports as consumed
+        """
+        if self.token_bucket and actual_tokens is not None:
+            self.token_bucket.adjust(reserved_tokens - actual_tokens)
+
+    def on_success(self):
+        with self.condition:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            self.condition.notify_all()
+
+    def on_rate_limited(self, retry_after=None, sent_at=None):
+        """
+        Backs off after a rate-limit response
+
+        Args:
+            retry_after (float): Delay requested by the upstream, if any
+            sent_at (float): Monotonic time the limited request was sent. Requests
+                already in flight when the window was last halved belong to the
+                same congestion event and do not halve it again.
+        """
+        with self.condition:
+            self.stats['rate_limited'] += 1
+            if sent_at is None or sent_at >= self.last_decrease:
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2.0)
+                self.last_decrease = time.monotonic()
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            logger.warning(f"{self.name} rate limited; concurrency window now {int(self.concurrency)}"
+                           + (f", pausing {retry_after:.1f}s" if retry_after else ""))
+
+    def post(self, url, tokens=0, **kwargs):
+        """
+        Sends a POST through the limiter, re-queueing it on rate-limit responses
+
+        Args:
+            url (str): The upstream URL
+            tokens (float): Estimated token cost of the request
+            **kwargs: Passed through to requests.post (the limiter's timeout
+                applies unless one is given)
+
+        Returns:
+            tuple: (requests.Response, reserved tokens of the final attempt)
+        """
+        # Each attempt is also bounded by the time left before the request's deadline
+        timeout = kwargs.pop('timeout', self.timeout)
+        attempt = 0
+        while True:
+            reserved = self.acquire(tokens)
+            progress = _call_progress.get()
+            sent_at = time.monotonic()
+            if progress is not None:
+                progress.sent_at = sent_at
+            try:
+                response = requests.post(url, timeout=timeout_for(timeout), **kwargs)
+                if progress is not None:
+                    progress.round_trip = time.monotonic() - sent_at
+            except requests.Timeout as e:
+                self.record_usage(reserved, 0)
+                remaining = remaining_time()
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineExceeded(f"Deadline exceeded waiting for {self.name}") from e
+                raise
+            except BaseException:
+                self.record_usage(reserved, 0)
+                raise
+            finally:
+                if progress is not None:
+                    progress.sent_at = None
+                self.release()
+
+            if not is_rate_limited(response):
+                self.on_success()
+                return response, reserved
+
+            self.record_usage(reserved, 0)
+            retry_after = parse_retry_after(response)
+            self.on_rate_limited(retry_after, sent_at)
+            if attempt >= MAX_RATE_LIMIT_RETRIES:
+                logger.error(f"{self.name} still rate limited after {attempt} retries")
+                return response, 0
+            attempt += 1
+            with self.condition:
+                self.stats['retries'] += 1
+            if not retry_after:
+                # No hint from the upstream: jittered exponential backoff
+                backoff = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+                time.sleep(min(backoff * random.uniform(0.5, 1.0), _time_left()))
+
+
+def _time_left():
+    """
+    Seconds a limiter may keep waiting before the request's deadline
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed while queued
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return float('inf')
+    if remaining <= 0:
+        raise DeadlineExceeded("Deadline exceeded while queued for an upstream")
+    return remaining
+
+
+def is_rate_limited(response):
+    """
+    Checks whether an upstream response is a retryable rate-limit error
+
+    Args:
+        response: The requests.Response
+
+    Returns:
+        bool: True for 429s (other than a hard quota), and Google RESOURCE_EXHAUSTED errors
+    """
+    if response.status_code not in (403, 429):
+        return False
+    try:
+        error = response.json().get('error', {})
+    except ValueError:
+        return response.status_code == 429
+    if not isinstance(error, dict):
+        return response.status_code == 429
+    # OpenAI: billing quota exhausted - retrying will not help
+    if error.get('code') == 'insufficient_quota' or error.get('type') == 'insufficient_quota':
+        return False
+    if response.status_code == 429:
+        return True
+    # Google APIs report some per-minute limits as 403 rateLimitExceeded
+    reasons = [e.get('reason') for e in error.get('errors', []) if isinstance(e, dict)]
+    return error.get('status') == 'RESOURCE_EXHAUSTED' or 'rateLimitExceeded' in reasons or 'userRateLimitExceeded' in reasons
+
+
+def parse_retry_after(response):
+    """
+    Reads the server's requested delay from Retry-After / retry-after-ms headers
+
+    Returns:
+        float or None: Delay in seconds
+    """
+    headers = response.headers or {}
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get('Retry-After')
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+        if parsed is None:
+            return None
+        return max(0.0, parsed.timestamp() - time.time())
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """
+    Returns the process-wide limiter for an upstream, creating it from config on first use
+
+    Args:
+        name (str): Upstream name ('openai', 'vision' or 'translate')
+
+    Returns:
+        UpstreamLimiter: The shared limiter
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            defaults = DEFAULT_LIMITS.get(name, {})
+            prefix = name.upper()
+            _limiters[name] = UpstreamLimiter(
+                name,
+                requests_per_minute=float(os.environ.get(f'{prefix}_REQUESTS_PER_MINUTE',
+                                                         defaults.get('requests_per_minute', 0))) / WEB_CONCURRENCY,
+                tokens_per_minute=float(os.environ.get(f'{prefix}_TOKENS_PER_MINUTE',
+                                                       defaults.get('tokens_per_minute', 0))) / WEB_CONCURRENCY,
+                max_concurrency=int(os.environ.get(f'{prefix}_MAX_CONCURRENCY', defaults.get('max_concurrency', 8))),
+                timeout=float(os.environ.get(f'{prefix}_TIMEOUT_SECONDS', defaults.get('timeout_seconds', 0))),
+            )
+        return _limiters[name]
+
+
+def limiter_stats():
+    """
+    Returns request/rate-limit counters and the current concurrency window per upstream
+
+    Returns:
+        dict: Stats keyed by upstream name
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    stats = {}
+    for name, limiter in limiters.items():
+        with limiter.condition:
+            stats[name] = dict(limiter.stats, concurrency=int(limiter.concurrency), in_flight=limiter.in_flight)
+    return stats
@@ -1,15 +1,20 @@
 import os
-import requests
 import json
 import time
 import logging
+import requests
+from app.services.rate_limiter import get_limiter
+from app.services.hedging import get_hedged_caller
+from app.profiling import stage
+from app.deadline import DeadlineExceeded, record_incomplete
+from app.services.dish_index import get_dish_index
 
 # Use environment variable for API key
 API_KEY = os.environ.get('GOOGLE_TRANSLATE_API_KEY')
-API_URL = f"https://translation.googleapis.com/language/translate/v2?key={API_KEY}"
+API_URL = f"{os.environ.get('GOOGLE_TRANSLATE_API_URL', 'https://translation.googleapis.com/language/translate/v2')}?key={API_KEY}"
 
 # Define the path for temp images/logs
-TEMP_IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'temp_images')
+TEMP_IMAGES_DIR = os.environ.get('TEMP_IMAGES_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'temp_images')
 logger = logging.getLogger(__name__)
 
 def translate_text(text, target_lang='en'):
@@ -21,48 +26,90 @@ def translate_text(text, target_lang='en'):
         target_lang (str): Target language code (e.g., 'en', 'th').
         
     Returns:
-        str or list: The translated text or list of translated menu items.
+        str or list: The translated text or list of translated menu items. If the
+            request deadline passes, list mode returns the items translated so far
+            and records the rest with app.deadline.record_incomplete. If the API
+            fails, the items translated from the dish index are still returned and
+            the rest keep their Thai name, marked "untranslated": true.
     """
     try:
         # Check if input is a list of menu items
         if isinstance(text, list) and all(isinstance(item, dict) and 'name' in item for item in text):
-            # Extract all menu item names for batch translation
-            menu_names = [item['name'] for item in text]
-            
-            # Join all names with a special delimiter for batch translation
-            batch_text = "|||".join(menu_names)
-            
-            # Translate the batch
-            response = requests.post(
-                API_URL,
-                headers={
-                    'Content-Type': 'application/json',
-                },
-                json={
-                    'q': batch_text,
-                    'target': target_lang,
-                    'format': 'text',
-                }
-            )
-            
-            data = response.json()
-            
-            if 'error' in data:
-                print(f"Translation API error: {data.get('error')}")
-                return 'Translation failed'
+            # Known dishes are translated locally from the curated datasets (English only)
+            translated_names = {}
+            failed = []
+            if target_lang == 'en':
+                with stage('dish_index'):
+                    dish_index = get_dish_index()
+                    for i, item in enumerate(text):
+                        english_name = dish_index.lookup(item['name'])
+                        if english_name:
+                            translated_names[i] = english_name
+            unknown = [i for i in range(len(text)) if i not in translated_names]
+            logger.info(f"{len(translated_names)}/{len(text)} menu names translated from the dish index")
             
-            # Split the translated text back into individual items
-            translated_names = data['data']['translations'][0]['translatedText'].split('|||')
+            if unknown:
+                # Extract the remaining menu item names for batch translation
+                menu_names = [text[i]['name'] for i in unknown]
+                
+                # Join all names with a special delimiter for batch translation
+                batch_text = "|||".join(menu_names)
+                
+                # Translate the batch
+                # Translate's quota is counted in characters, so that is the token cost
+                try:
+                    with stage('translate_api'):
+                        (response, _), _ = get_hedged_caller('translate').call(lambda: get_limiter('translate').post(
+                            API_URL,
+                            tokens=len(batch_text),
+                            headers={
+                                'Content-Type': 'application/json',
+                            },
+                            json={
+                                'q': batch_text,
+                                'target': target_lang,
+                                'format': 'text',
+                            }
+                        ))
+                        data = response.json()
+                except DeadlineExceeded as e:
+                    # Keep the locally translated items; the rest are reported as incomplete
+                    print(f"Translation stopped: {e}")
+                    for i in unknown:
+                        record_incomplete('translate', i, text[i]['name'])
+                    data = None
+                except (requests.RequestException, ValueError) as e:
+                    # Timeouts, connection errors and non-JSON bodies are handled like an error body
+                    data = {'error': str(e)}
+                
+                if data is not None:
+                    if 'error' in data:
+                        print(f"Translation API error: {data.get('error')}")
+                        if not translated_names:
+                            return 'Translation failed'
+                        # Keep the dish index translations; the rest are returned untranslated
+                        failed = unknown
+                    else:
+                        # Split the translated text back into individual items
+                        api_names = data['data']['translations'][0]['translatedText'].split('|||')
+                        translated_names.update(zip(unknown, api_names))
             
             # Create a new list with both original Thai names and translated names
             translated_menu = []
             for i, item in enumerate(text):
-                if i < len(translated_names):
+                if i in translated_names:
                     translated_menu.append({
                         "name": translated_names[i],
                         "thaiName": item['name'],
                         "price": item['price']
                     })
+                elif i in failed:
+                    translated_menu.append({
+                        "name": item['name'],
+                        "thaiName": item['name'],
+                        "price": item['price'],
+                        "untranslated": True
+                    })
             
             # Persist translation results as text
             try:
@@ -78,24 +125,30 @@ def translate_text(text, target_lang='en'):
             
             return translated_menu
         else:
-            # Handle regular text translation
+            # Handle regular text translation; a single known dish name is translated locally
+            if isinstance(text, str) and target_lang == 'en':
+                english_name = get_dish_index().lookup(text)
+                if english_name:
+                    return english_name
+            
             text_to_translate = text
             if isinstance(text, (dict, list)):
                 text_to_translate = json.dumps(text)
                 
-            response = requests.post(
-                API_URL,
-                headers={
-                    'Content-Type': 'application/json',
-                },
-                json={
-                    'q': text_to_translate,
-                    'target': target_lang,
-                    'format': 'text',
-                }
-            )
-            
-            data = response.json()
+            with stage('translate_api'):
+                (response, _), _ = get_hedged_caller('translate').call(lambda: get_limiter('translate').post(
+                    API_URL,
+                    tokens=len(text_to_translate),
+                    headers={
+                        'Content-Type': 'application/json',
+                    },
+                    json={
+                        'q': text_to_translate,
+                        'target': target_lang,
+                        'format': 'text',
+                    }
+                ))
+                data = response.json()
             
             if 'error' in data:
                 print(f"Translation API error: {data.get('error')}")
@@ -118,6 +171,10 @@ def translate_text(text, target_lang='en'):
                 logger.error(f"Error logging text translation: {log_err}")
             
             return translated_text
+    except DeadlineExceeded as e:
+        print(f"Translation stopped: {e}")
+        record_incomplete('translate', 0, text)
+        return 'Translation failed'
     except Exception as e:
         print(f"Error during translation: {e}")
         return 'Translation failed' 
\ No newline at end of file
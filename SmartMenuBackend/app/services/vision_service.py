@@ -1,26 +1,71 @@
 import os
 import base64
-import requests
-from google.cloud import vision
-import io
-import tempfile
 import logging
-import cv2
-import numpy as np
 import shutil
 import time
-from scipy.signal import find_peaks
 import json
+import math
+import re
+import statistics
+import importlib.util
+from app.services.rate_limiter import get_limiter
+from app.services.hedging import get_hedged_caller, register_fallback
+from app.profiling import stage
+from app.deadline import check_deadline
+
+# OpenCV and numpy are imported inside the functions that use them. They account for
+# most of the worker's import time and baseline RSS, and plain text endpoints never need them.
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Use environment variable for API key
 API_KEY = os.environ.get('GOOGLE_VISION_API_KEY')
-API_URL = f"https://vision.googleapis.com/v1/images:annotate?key={API_KEY}"
+API_URL = f"{os.environ.get('GOOGLE_VISION_API_URL', 'https://vision.googleapis.com/v1/images:annotate')}?key={API_KEY}"
 
 # Define the path for temp images
-TEMP_IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'temp_images')
+TEMP_IMAGES_DIR = os.environ.get('TEMP_IMAGES_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'temp_images')
+
+# Pixels of tolerance for grouping words into the same line
+LINE_Y_TOLERANCE = 8
+
+# Marks the boundary between layout columns in bounding_box_text.
+# The parser splits on the form feed so each column is parsed as its own chunk.
+COLUMN_BREAK = '\n\f\n'
+
+# Column segmentation settings (widths are in multiples of the median word height)
+MIN_GUTTER_WIDTH = 1.5          # Narrowest gap that counts as a gutter
+GUTTER_MAX_DENSITY = 0.1        # Max x-projection inside a gutter, relative to the peak
+MIN_COLUMN_SHARE = 0.1          # Each column must hold at least this share of the words
+MAX_PRICE_SHARE = 0.5           # A "column" made mostly of prices belongs to its neighbour
+# Prices, and the currency words Vision returns on their own ("60" "บาท")
+PRICE_TOKEN = re.compile(r'^([\d๐-๙.,/\-–฿]+(บาท|\.-)?|บาท)$')
+
+# Deskew strategy before upload: 'pixel' rotates the image with a projection-profile
+# sweep; 'geometry' uploads the image as-is and straightens the word boxes instead
+DESKEW_MODE = os.environ.get('DESKEW_MODE', 'pixel').lower()
+MIN_SKEW_EDGE_LENGTH = 20       # Shorter word edges give unreliable angles (pixels)
+MIN_SKEW_SAMPLES = 5            # Fewer usable edges than this: assume no skew
+MIN_SKEW_CORRECTION = 0.1       # Degrees below which rotation is not worth applying
+
+# Languages for the local Tesseract fallback (VISION_FALLBACK=tesseract)
+TESSERACT_LANGUAGES = os.environ.get('TESSERACT_LANGUAGES', 'tha+eng')
+
+# Crop the photo to the menu before deskew and upload, dropping the table, hands and
+# background around it. Word coordinates are mapped back to the uploaded photo's frame.
+# Off by default: text cut off here is lost to OCR, so enable it only after
+# benchmarks/crop_benchmark.py --live shows no lines lost on your photos.
+MENU_CROP = os.environ.get('MENU_CROP', 'false').lower() == 'true'
+MENU_CROP_ANALYSIS_SIZE = 640   # Longest side of the copy the region is located on (pixels)
+MENU_CROP_TRIM = 0.005          # Share of the text mass ignored at each end of the seed region
+MENU_CROP_GAP = 0.06            # Marks this close to the region (relative to the image size) join it
+MENU_CROP_MARGIN = 0.05         # Padding around the region, relative to the image size
+MENU_CROP_MAX_AREA = 0.9        # Regions keeping more of the frame than this are not cropped
+MENU_CROP_UNIFORM_RANGE = 16    # Edge rows/columns varying by less than this (0-255) are plain border
+MENU_CROP_BORDER_PAD = 2        # Pixels of the plain border kept (on the analysis copy)
+MIN_TEXT_HEIGHT = 0.006         # Text-like components are this tall at least...
+MAX_TEXT_HEIGHT = 0.15          # ...and at most this tall (relative to the image height)
+MAX_TEXT_WIDTH = 0.6            # Wider components are edges of the table, paper or frame
 
 def clean_temp_images():
     """
@@ -29,6 +74,9 @@ def clean_temp_images():
     try:
         if os.path.exists(TEMP_IMAGES_DIR):
             for file in os.listdir(TEMP_IMAGES_DIR):
+                # Request profiles are kept across requests
+                if file == 'profiles':
+                    continue
                 file_path = os.path.join(TEMP_IMAGES_DIR, file)
                 try:
                     if os.path.isfile(file_path):
@@ -44,16 +92,226 @@ def clean_temp_images():
     except Exception as e:
         logger.error(f"Error cleaning temporary images: {e}")
 
-def deskew_image(image_bytes):
+def find_menu_region(gray):
+    """
+    Locates the menu in a (downscaled) grayscale image
+    
+    Strokes are picked out with a morphological gradient and Otsu threshold and
+    joined along lines. The region starts where the bulk of the text-like
+    components lies along each axis, then absorbs every mark (headers, banners,
+    isolated lines, pictures) within MENU_CROP_GAP of it until a clear empty
+    band surrounds it, plus a margin. Busy backgrounds therefore grow the
+    region to the full frame rather than cut into the menu.
+    
+    Args:
+        gray: Grayscale image as a numpy array
+        
+    Returns:
+        tuple: (x0, y0, x1, y1) in the image's pixels, or None if no text was found
+    """
+    import cv2
+    import numpy as np
+
+    height, width = gray.shape
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    comp_x, comp_y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    comp_w, comp_h, comp_area = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT], stats[:, cv2.CC_STAT_AREA]
+    text_like = ((comp_h >= MIN_TEXT_HEIGHT * height) & (comp_h <= MAX_TEXT_HEIGHT * height) &
+                 (comp_w >= 2) & (comp_w <= MAX_TEXT_WIDTH * width) & (comp_area >= 0.1 * comp_w * comp_h))
+    text_like[0] = False  # Background label
+    if not text_like.any():
+        return None
+    text = text_like[labels]
+    
+    def bulk(projection):
+        # Index range holding all but MENU_CROP_TRIM of the mass at each end
+        cumulative = np.cumsum(projection, dtype=np.float64)
+        total = cumulative[-1]
+        return (int(np.searchsorted(cumulative, total * MENU_CROP_TRIM)),
+                int(np.searchsorted(cumulative, total * (1 - MENU_CROP_TRIM))) + 1)
+    
+    y0, y1 = bulk(text.sum(axis=1))
+    x0, x1 = bulk(text.sum(axis=0))
+    
+    # Grow the seed over any mark near it; only specks and the frame itself are ignored
+    marks = comp_h >= MIN_TEXT_HEIGHT * height
+    marks &= ~((comp_w > 0.9 * width) & (comp_h > 0.9 * height))
+    marks[0] = False
+    right, bottom = comp_x + comp_w, comp_y + comp_h
+    gap_x, gap_y = MENU_CROP_GAP * width, MENU_CROP_GAP * height
+    while True:
+        near = (marks & (comp_x <= x1 + gap_x) & (right >= x0 - gap_x) &
+                (comp_y <= y1 + gap_y) & (bottom >= y0 - gap_y))
+        if not near.any():
+            break
+        grown = (min(x0, int(comp_x[near].min())), min(y0, int(comp_y[near].min())),
+                 max(x1, int(right[near].max())), max(y1, int(bottom[near].max())))
+        if grown == (x0, y0, x1, y1):
+            break
+        x0, y0, x1, y1 = grown
+    
+    margin_x, margin_y = MENU_CROP_MARGIN * width, MENU_CROP_MARGIN * height
+    return (max(0, int(x0 - margin_x)), max(0, int(y0 - margin_y)),
+            min(width, int(math.ceil(x1 + margin_x))), min(height, int(math.ceil(y1 + margin_y))))
+
+def find_content_box(gray):
+    """
+    Finds the image inside any plain border (scanner bed, letterboxing, a mat)
+    
+    Args:
+        gray: Grayscale image as a numpy array
+        
+    Returns:
+        tuple: (x0, y0, x1, y1) without the uniform rows and columns at the edges,
+               or None if the whole image is uniform
+    """
+    import numpy as np
+
+    def span(varied):
+        indices = np.flatnonzero(varied)
+        return (int(indices[0]), int(indices[-1]) + 1) if len(indices) else None
+
+    rows = span(gray.max(axis=1).astype(np.int16) - gray.min(axis=1) > MENU_CROP_UNIFORM_RANGE)
+    if rows is None:
+        return None
+    inner = gray[rows[0]:rows[1]]
+    x0, x1 = span(inner.max(axis=0).astype(np.int16) - inner.min(axis=0) > MENU_CROP_UNIFORM_RANGE)
+    return x0, rows[0], x1, rows[1]
+
+def _menu_region_share(gray):
+    """Finds the menu region on a grayscale image; returns it and the share of the frame it keeps"""
+    import cv2
+
+    scale = min(1.0, MENU_CROP_ANALYSIS_SIZE / float(max(gray.shape)))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+    # A plain border is always dropped; the menu is then looked for inside it
+    content = find_content_box(small)
+    if content is None:
+        return None, 1.0
+    cx0, cy0, cx1, cy1 = content
+    region = find_menu_region(small[cy0:cy1, cx0:cx1])
+    if region is None:
+        x0, y0, x1, y1 = content
+    else:
+        x0, y0, x1, y1 = region[0] + cx0, region[1] + cy0, region[2] + cx0, region[3] + cy0
+    # Keep a couple of pixels more: a pale paper edge can fade into a white border
+    pad = MENU_CROP_BORDER_PAD
+    x0, y0 = max(0, x0 - pad), max(0, y0 - pad)
+    x1, y1 = min(small.shape[1], x1 + pad), min(small.shape[0], y1 + pad)
+    height, width = gray.shape
+    # Back in the pixels of the image passed in
+    region = (int(x0 / scale), int(y0 / scale), min(width, int(math.ceil(x1 / scale))),
+              min(height, int(math.ceil(y1 / scale))))
+    return region, (x1 - x0) * (y1 - y0) / float(small.shape[0] * small.shape[1])
+
+def crop_to_menu_region(image_bytes):
+    """
+    Crops a photo to the menu region before deskew and upload
+    
+    Any plain border is dropped, then the menu is looked for inside it. A
+    reduced-size decode first checks whether there is anything to crop, so
+    photos that are mostly menu are passed through without a full decode or
+    re-encode. Otherwise the region is found again on the full decode, which
+    applies the EXIF orientation like deskew_image, so the crop is always
+    taken in the frame it was found in.
+    
+    Args:
+        image_bytes: The image bytes
+        
+    Returns:
+        tuple: Image bytes (cropped or unchanged) and the crop as a dict with
+               x, y, width and height in the original pixels, or None if not cropped
+    """
+    import cv2
+    import numpy as np
+
+    try:
+        image_array = np.frombuffer(image_bytes, np.uint8)
+        # The reduced decode skips most of the JPEG work on large photos
+        reduced = cv2.imdecode(image_array, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+        if reduced is None:
+            return image_bytes, None
+        _, kept = _menu_region_share(reduced)
+        if kept > MENU_CROP_MAX_AREA:
+            logger.info(f'Skipping menu crop - region covers {kept:.0%} of the photo')
+            return image_bytes, None
+        
+        img = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+        region, kept = _menu_region_share(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+        if region is None or kept > MENU_CROP_MAX_AREA:
+            logger.info(f'Skipping menu crop - region covers {kept:.0%} of the photo')
+            return image_bytes, None
+        
+        x0, y0, x1, y1 = region
+        _, cropped = cv2.imencode('.jpg', img[y0:y1, x0:x1], [cv2.IMWRITE_JPEG_QUALITY, 95])
+        
+        logger.info(f'Cropped to menu region {x1 - x0}x{y1 - y0} at ({x0}, {y0}), {kept:.0%} of the photo')
+        return cropped.tobytes(), {'x': x0, 'y': y0, 'width': x1 - x0, 'height': y1 - y0}
+    except Exception as e:
+        logger.exception(f"Error cropping to menu region: {e}")
+        return image_bytes, None
+
+def offset_annotations(result, crop):
+    """
+    Maps Vision coordinates from the cropped image back to the original photo
+    
+    When the crop was deskewed (pixel mode, crop['angle']), every box is first
+    rotated back around the crop's center, as deskew_image rotated it. Then the
+    crop offset is added, to every word box and to the boxes in the full text
+    tree, and the crop is recorded in the result as menu_crop. Run it after the
+    bounding-box layout, which needs the deskewed boxes.
+    
+    Args:
+        result: The Vision response from annotate_image (updated in place)
+        crop: The crop from prepare_image, or None
+    """
+    if not crop or not result.get('responses'):
+        return
+    dx, dy = crop['x'], crop['y']
+    # deskew_image rotated the crop by `angle` around this point (cv2.getRotationMatrix2D)
+    center_x, center_y = crop['width'] // 2, crop['height'] // 2
+    cos_a = math.cos(math.radians(crop.get('angle', 0.0)))
+    sin_a = math.sin(math.radians(crop.get('angle', 0.0)))
+    
+    def shift(poly):
+        # Vision leaves out coordinates that are 0
+        for vertex in poly.get('vertices', []):
+            x, y = vertex.get('x', 0) - center_x, vertex.get('y', 0) - center_y
+            vertex['x'] = round(center_x + cos_a * x - sin_a * y + dx)
+            vertex['y'] = round(center_y + sin_a * x + cos_a * y + dy)
+    
+    response = result['responses'][0]
+    for annotation in response.get('textAnnotations', []):
+        shift(annotation.get('boundingPoly', {}))
+    for page in response.get('fullTextAnnotation', {}).get('pages', []):
+        for block in page.get('blocks', []):
+            shift(block.get('boundingBox', {}))
+            for paragraph in block.get('paragraphs', []):
+                shift(paragraph.get('boundingBox', {}))
+                for word in paragraph.get('words', []):
+                    shift(word.get('boundingBox', {}))
+                    for symbol in word.get('symbols', []):
+                        shift(symbol.get('boundingBox', {}))
+    result['menu_crop'] = crop
+
+def deskew_image(image_bytes, save_artifacts=True):
     """
     Deskews an image using Projection Profile method
     
     Args:
         image_bytes: The image bytes
+        save_artifacts: Whether to write the original and deskewed images to TEMP_IMAGES_DIR
         
     Returns:
         tuple: Deskewed image bytes and any metadata
     """
+    import cv2
+    import numpy as np
+
     try:
         # Convert image bytes to numpy array
         image_array = np.frombuffer(image_bytes, np.uint8)
@@ -63,8 +321,10 @@ def deskew_image(image_bytes):
         timestamp = int(time.time())
         
         # Save original image
-        original_path = os.path.join(TEMP_IMAGES_DIR, f"original_{timestamp}.jpg")
-        cv2.imwrite(original_path, img)
+        original_path = None
+        if save_artifacts:
+            original_path = os.path.join(TEMP_IMAGES_DIR, f"original_{timestamp}.jpg")
+            cv2.imwrite(original_path, img)
         
         # Convert to grayscale and apply Gaussian blur to reduce noise
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
@@ -116,8 +376,10 @@ def deskew_image(image_bytes):
                                  flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
         
         # Save deskewed image
-        deskewed_path = os.path.join(TEMP_IMAGES_DIR, f"deskewed_{timestamp}.jpg")
-        cv2.imwrite(deskewed_path, deskewed)
+        deskewed_path = None
+        if save_artifacts:
+            deskewed_path = os.path.join(TEMP_IMAGES_DIR, f"deskewed_{timestamp}.jpg")
+            cv2.imwrite(deskewed_path, deskewed)
         
         # Convert deskewed image back to bytes
         _, deskewed_bytes = cv2.imencode('.jpg', deskewed)
@@ -130,6 +392,23 @@ def deskew_image(image_bytes):
         logger.exception(f"Error deskewing image: {e}")
         return image_bytes, {}
 
+def warm_up():
+    """
+    Imports the heavy image-processing dependencies ahead of the first request.
+    
+    Safe to call in a gunicorn master before forking (preload mode): it only loads
+    modules and decodes a tiny image, so no OpenCV worker threads are started and the
+    loaded pages are shared copy-on-write with every worker.
+    """
+    start = time.perf_counter()
+    import cv2
+    import numpy as np
+
+    # Touch the JPEG codec so its lazy initialisation happens here too
+    _, encoded = cv2.imencode('.jpg', np.zeros((8, 8, 3), np.uint8))
+    cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    logger.info(f"Vision dependencies warmed up in {time.perf_counter() - start:.2f}s")
+
 def image_to_base64(image_file):
     """
     Converts an image file to base64
@@ -150,13 +429,144 @@ def image_to_base64(image_file):
         logger.error(f"Error converting image to base64: {e}")
         raise
 
-def detect_text(image_file, use_bounding_box=True):
+def save_original_image(image_bytes):
+    """
+    Saves the uploaded bytes unchanged to the temp images folder (no decode)
+    
+    Args:
+        image_bytes: The image bytes
+        
+    Returns:
+        dict: Metadata with the saved path
+    """
+    try:
+        original_path = os.path.join(TEMP_IMAGES_DIR, f"original_{int(time.time())}.jpg")
+        with open(original_path, 'wb') as f:
+            f.write(image_bytes)
+        return {"original_path": original_path}
+    except Exception as e:
+        logger.error(f"Error saving original image: {e}")
+        return {}
+
+def prepare_image(image_content, deskew_mode=None, save_artifacts=True):
+    """
+    Readies image bytes for OCR: menu crop, then pixel deskew (none in geometry mode)
+    
+    Args:
+        image_content: The image bytes
+        deskew_mode: 'pixel' or 'geometry' (defaults to DESKEW_MODE)
+        save_artifacts: Whether to write debug images to TEMP_IMAGES_DIR
+        
+    Returns:
+        tuple: Image bytes to upload and metadata (with the crop for
+               offset_annotations under 'crop' when the photo was cropped,
+               including the deskew angle when the crop was rotated)
+    """
+    crop = None
+    if MENU_CROP:
+        with stage('menu_crop'):
+            image_content, crop = crop_to_menu_region(image_content)
+    
+    if (deskew_mode or DESKEW_MODE).lower() == 'geometry':
+        prepared, metadata = image_content, (save_original_image(image_content) if save_artifacts else {})
+    else:
+        prepared, metadata = deskew_image(image_content, save_artifacts)
+    if crop:
+        if metadata.get('angle'):
+            crop['angle'] = float(metadata['angle'])
+        metadata['crop'] = crop
+    return prepared, metadata
+
+def annotate_image(image_content):
+    """
+    Runs DOCUMENT_TEXT_DETECTION on prepared image bytes
+    
+    Args:
+        image_content: The (deskewed) image bytes
+        
+    Returns:
+        dict: The Vision response, with original_text when text was found
+    """
+    # Convert deskewed image to base64
+    with stage('encode_request'):
+        base64_image = base64.b64encode(image_content).decode('utf-8')
+    
+    # Prepare request body
+    body = {
+        "requests": [
+            {
+                "image": {
+                    "content": base64_image,
+                },
+                "features": [
+                    {
+                        "type": "DOCUMENT_TEXT_DETECTION"
+                    },
+                ],
+                "imageContext": {
+                    "languageHints": ["th", "en"]
+                }
+            },
+        ],
+    }
+
+    logger.info('Sending request to Vision API...')
+    
+    # Make API request (hedged against slow calls; a local OCR fallback gets the image)
+    with stage('vision_api'):
+        outcome, source = get_hedged_caller('vision').call(lambda: get_limiter('vision').post(
+            API_URL,
+            headers={
+                'Accept': 'application/json',
+                'Content-Type': 'application/json',
+            },
+            json=body
+        ), fallback_args=(image_content,))
+    
+    # Parse response
+    if source == 'fallback':
+        result = outcome
+    else:
+        with stage('vision_json'):
+            result = outcome[0].json()
+    
+    # Check for errors
+    if 'error' in result:
+        error_message = result.get('error', {}).get('message', 'Error detecting text')
+        logger.error(f"API Error: {error_message}")
+        raise Exception(error_message)
+    
+    # Always save original text
+    if 'responses' in result and len(result['responses']) > 0:
+        if 'textAnnotations' in result['responses'][0] and len(result['responses'][0]['textAnnotations']) > 0:
+            result['original_text'] = result['responses'][0]['textAnnotations'][0]['description']
+    return result
+
+def add_bounding_box_text(result, split_columns=True, correct_skew=False):
+    """
+    Adds bounding_box_text (lines rebuilt from the word boxes) to a Vision result
+    
+    Args:
+        result: The Vision response from annotate_image (updated in place)
+        split_columns: Whether text is emitted per layout column
+        correct_skew: Whether word boxes are straightened first (geometry deskew)
+    """
+    bbox_processed_text = process_text_with_bounding_boxes(result, split_columns, correct_skew)
+    
+    # Include the bounding box processed text in the result
+    if 'responses' in result and len(result['responses']) > 0:
+        result['bounding_box_text'] = bbox_processed_text
+        logger.info('Bounding box processing completed successfully')
+
+def detect_text(image_file, use_bounding_box=True, split_columns=True, deskew_mode=None):
     """
     Detects text in an image using Google Cloud Vision API
     
     Args:
         image_file: The image file object
         use_bounding_box: Whether to use bounding box text processing
+        split_columns: Whether bounding box processing emits text per layout column
+        deskew_mode: 'pixel' or 'geometry' (defaults to DESKEW_MODE)
         
     Returns:
         dict: The API response with detected text
@@ -166,102 +576,364 @@ def detect_text(image_file, use_bounding_box=True):
         image_file.seek(0)
         
         # Clean temp images folder before processing
-        clean_temp_images()
+        with stage('clean_temp_images'):
+            clean_temp_images()
         
         # Read the image
         image_content = image_file.read()
         
-        # Deskew the image before processing
-        deskewed_content, metadata = deskew_image(image_content)
+        # Do not start the OpenCV work if the request is already out of time
+        check_deadline('deskew')
         
-        # Convert deskewed image to base64
-        base64_image = base64.b64encode(deskewed_content).decode('utf-8')
+        # Crop to the menu and deskew the image before processing, unless the skew
+        # is corrected from the word geometry afterwards (skips the OpenCV warp)
+        deskew_mode = (deskew_mode or DESKEW_MODE).lower()
+        with stage('deskew'):
+            deskewed_content, metadata = prepare_image(image_content, deskew_mode)
         
-        # Prepare request body
-        body = {
-            "requests": [
-                {
-                    "image": {
-                        "content": base64_image,
-                    },
-                    "features": [
-                        {
-                            "type": "DOCUMENT_TEXT_DETECTION"
-                        },
-                    ],
-                    "imageContext": {
-                        "languageHints": ["th", "en"]
-                    }
-                },
-            ],
-        }
-
-        logger.info('Sending request to Vision API...')
-        
-        # Make API request
-        response = requests.post(
-            API_URL,
-            headers={
-                'Accept': 'application/json',
-                'Content-Type': 'application/json',
-            },
-            json=body
-        )
-        
-        # Parse response
-        result = response.json()
-        
-        # Check for errors
-        if 'error' in result:
-            error_message = result.get('error', {}).get('message', 'Error detecting text')
-            logger.error(f"API Error: {error_message}")
-            raise Exception(error_message)
-        
-        # Always save original text
-        if 'responses' in result and len(result['responses']) > 0:
-            if 'textAnnotations' in result['responses'][0] and len(result['responses'][0]['textAnnotations']) > 0:
-                result['original_text'] = result['responses'][0]['textAnnotations'][0]['description']
+        result = annotate_image(deskewed_content)
         
         # Only process with bounding boxes if enabled
         if use_bounding_box:
             logger.info('Processing text with bounding boxes...')
-            bbox_processed_text = process_text_with_bounding_boxes(result)
-            
-            # Include the bounding box processed text in the result
-            if 'responses' in result and len(result['responses']) > 0:
-                result['bounding_box_text'] = bbox_processed_text
-                logger.info('Bounding box processing completed successfully')
+            with stage('bbox_layout'):
+                add_bounding_box_text(result, split_columns, deskew_mode == 'geometry')
         else:
             logger.info('Bounding box processing disabled, using original text')
+        # Boxes back in the original photo's frame (after the layout, which works on the deskewed boxes)
+        offset_annotations(result, metadata.get('crop'))
         
         # Log OCR original text and full Vision response to files, regardless of settings
-        try:
-            os.makedirs(TEMP_IMAGES_DIR, exist_ok=True)
-            ts = int(time.time())
+        with stage('artifact_logging'):
+            try:
+                os.makedirs(TEMP_IMAGES_DIR, exist_ok=True)
+                ts = int(time.time())
             
-            # Save original OCR text if available
-            if 'original_text' in result and isinstance(result['original_text'], str):
-                ocr_text_path = os.path.join(TEMP_IMAGES_DIR, f"ocr_original_{ts}.txt")
-                with open(ocr_text_path, 'w', encoding='utf-8') as f:
-                    f.write(result['original_text'])
-                logger.info(f"OCR original text logged to {ocr_text_path}")
-        except Exception as log_err:
-            logger.error(f"Error logging Vision results: {log_err}")
+                # Save original OCR text if available
+                if 'original_text' in result and isinstance(result['original_text'], str):
+                    ocr_text_path = os.path.join(TEMP_IMAGES_DIR, f"ocr_original_{ts}.txt")
+                    with open(ocr_text_path, 'w', encoding='utf-8') as f:
+                        f.write(result['original_text'])
+                    logger.info(f"OCR original text logged to {ocr_text_path}")
+            except Exception as log_err:
+                logger.error(f"Error logging Vision results: {log_err}")
         
         return result
     except Exception as e:
         logger.exception(f"Error in text detection: {e}")
         raise
 
-def process_text_with_bounding_boxes(vision_response):
+def detect_text_with_tesseract(image_bytes):
+    """
+    Runs local Tesseract OCR and shapes the result like a Vision response
+    
+    Used as the Vision fallback backend (VISION_FALLBACK=tesseract) when the API
+    is too slow or failing. Needs the optional pytesseract package and a
+    tesseract binary with the TESSERACT_LANGUAGES data installed.
+    
+    Args:
+        image_bytes (bytes): The (deskewed) image
+        
+    Returns:
+        dict: {'responses': [{'textAnnotations': [...]}]} with the full text
+              first and one annotation per word, as the bounding box layout expects
+    """
+    import cv2
+    import numpy as np
+    import pytesseract
+    
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    data = pytesseract.image_to_data(image, lang=TESSERACT_LANGUAGES, output_type=pytesseract.Output.DICT)
+    
+    words = []
+    lines = {}
+    for i, text in enumerate(data['text']):
+        text = text.strip()
+        if not text or float(data['conf'][i]) < 0:
+            continue
+        x, y, w, h = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
+        words.append({
+            'description': text,
+            'boundingPoly': {'vertices': [{'x': x, 'y': y}, {'x': x + w, 'y': y},
+                                          {'x': x + w, 'y': y + h}, {'x': x, 'y': y + h}]}
+        })
+        lines.setdefault((data['block_num'][i], data['par_num'][i], data['line_num'][i]), []).append(text)
+    
+    if not words:
+        return {'responses': [{}]}
+    full_text = '\n'.join(' '.join(line) for line in lines.values())
+    return {'responses': [{'textAnnotations': [{'description': full_text}] + words}]}
+
+# Only selectable when the optional dependency is installed
+if importlib.util.find_spec('pytesseract') is not None:
+    register_fallback('vision', 'tesseract', detect_text_with_tesseract)
+
+def estimate_skew_angle(text_annotations):
+    """
+    Estimates the page rotation from the orientation of the word quadrilaterals
+    
+    Vision returns each word's vertices in reading order (top-left, top-right,
+    bottom-right, bottom-left), so the top and bottom edges follow the baseline.
+    The estimate is the median edge angle around their circular mean, which
+    ignores the odd vertical or mis-detected word.
+    
+    Args:
+        text_annotations: The per-word textAnnotations (without the full-text entry)
+        
+    Returns:
+        float: Rotation of the text in degrees (positive = clockwise in image coordinates)
+    """
+    angles = []
+    for annotation in text_annotations:
+        vertices = annotation.get('boundingPoly', {}).get('vertices', [])
+        if len(vertices) != 4:
+            continue
+        for start, end in ((vertices[0], vertices[1]), (vertices[3], vertices[2])):
+            dx = end.get('x', 0) - start.get('x', 0)
+            dy = end.get('y', 0) - start.get('y', 0)
+            if math.hypot(dx, dy) >= MIN_SKEW_EDGE_LENGTH:
+                angles.append(math.atan2(dy, dx))
+    
+    if len(angles) < MIN_SKEW_SAMPLES:
+        return 0.0
+    
+    # Median of the angles unwrapped around the circular mean (safe near +/-180 degrees)
+    mean = math.atan2(sum(math.sin(a) for a in angles), sum(math.cos(a) for a in angles))
+    offsets = [math.atan2(math.sin(a - mean), math.cos(a - mean)) for a in angles]
+    return math.degrees(mean + statistics.median(offsets))
+
+def extract_text_elements(text_annotations, rotation=0.0):
+    """
+    Extracts word-level text elements and their bounding boxes from Vision annotations
+    
+    Args:
+        text_annotations: The per-word textAnnotations (without the full-text entry)
+        rotation: Page skew in degrees (see estimate_skew_angle). When non-zero, the
+            word vertices are rotated back by this angle around the text's center first.
+        
+    Returns:
+        list: Dicts with text, center and min/max coordinates for each word
+    """
+    if rotation:
+        text_annotations = straighten_annotations(text_annotations, rotation)
+    
+    text_elements = []
+    for annotation in text_annotations:
+        text = annotation['description']
+        vertices = annotation['boundingPoly']['vertices']
+        
+        # Calculate bounding box coordinates
+        x_coords = [v.get('x', 0) for v in vertices if 'x' in v]
+        y_coords = [v.get('y', 0) for v in vertices if 'y' in v]
+        
+        if not x_coords or not y_coords:
+            continue
+            
+        # Calculate center of bounding box
+        x_min, x_max = min(x_coords), max(x_coords)
+        y_min, y_max = min(y_coords), max(y_coords)
+        
+        text_elements.append({
+            'text': text,
+            'center_x': (x_min + x_max) / 2,
+            'center_y': (y_min + y_max) / 2,
+            'x_min': x_min,
+            'x_max': x_max,
+            'y_min': y_min,
+            'y_max': y_max
+        })
+    return text_elements
+
+def straighten_annotations(text_annotations, rotation):
+    """
+    Rotates the word vertices by -rotation degrees around the center of all words
+    
+    Args:
+        text_annotations: The per-word textAnnotations
+        rotation: Page skew in degrees
+        
+    Returns:
+        list: Annotations with description and rotated boundingPoly vertices
+    """
+    points = [(v.get('x', 0), v.get('y', 0))
+              for a in text_annotations for v in a.get('boundingPoly', {}).get('vertices', [])]
+    if not points:
+        return text_annotations
+    center_x = (min(p[0] for p in points) + max(p[0] for p in points)) / 2
+    center_y = (min(p[1] for p in points) + max(p[1] for p in points)) / 2
+    cos_a = math.cos(math.radians(-rotation))
+    sin_a = math.sin(math.radians(-rotation))
+    
+    straightened = []
+    for annotation in text_annotations:
+        vertices = []
+        for v in annotation.get('boundingPoly', {}).get('vertices', []):
+            dx = v.get('x', 0) - center_x
+            dy = v.get('y', 0) - center_y
+            vertices.append({
+                'x': center_x + dx * cos_a - dy * sin_a,
+                'y': center_y + dx * sin_a + dy * cos_a
+            })
+        straightened.append({'description': annotation['description'], 'boundingPoly': {'vertices': vertices}})
+    return straightened
+
+def group_elements_into_lines(text_elements, y_tolerance=LINE_Y_TOLERANCE):
+    """
+    Groups text elements into lines by vertical position, ordered left to right
+    
+    Args:
+        text_elements: Elements as returned by extract_text_elements
+        y_tolerance: Pixels of tolerance for grouping by vertical alignment
+        
+    Returns:
+        list: Lines sorted top to bottom, each a dict with 'text', 'center_y',
+              'box' ([x_min, y_min, x_max, y_max]) and its 'elements'
+    """
+    line_groups = {}
+    
+    for element in text_elements:
+        center_y = element['center_y']
+        
+        # Check if this element can be added to an existing line group
+        found_group = False
+        for group_y in line_groups.keys():
+            if abs(center_y - group_y) <= y_tolerance:
+                line_groups[group_y].append(element)
+                found_group = True
+                break
+        
+        # If no suitable group was found, create a new one
+        if not found_group:
+            line_groups[center_y] = [element]
+    
+    # Sort each line group by x position (left to right)
+    lines = []
+    for group_y, elements in line_groups.items():
+        sorted_elements = sorted(elements, key=lambda e: e['x_min'])
+        lines.append({
+            'text': ''.join([e['text'] for e in sorted_elements]),
+            'center_y': group_y,
+            'box': [
+                min(e['x_min'] for e in sorted_elements),
+                min(e['y_min'] for e in sorted_elements),
+                max(e['x_max'] for e in sorted_elements),
+                max(e['y_max'] for e in sorted_elements)
+            ],
+            'elements': sorted_elements
+        })
+    
+    # Sort lines by y position (top to bottom)
+    lines.sort(key=lambda line: line['center_y'])
+    return lines
+
+def find_column_gutters(text_elements):
+    """
+    Finds the x positions of column gutters from the x-projection of word boxes
+    
+    Gutters are valleys of the projection (peaks of its negation) that are wide,
+    nearly empty, and separate columns of real text. Valleys that would split a
+    column of prices off from its dish names are discarded.
+    
+    Args:
+        text_elements: Elements as returned by extract_text_elements
+        
+    Returns:
+        list: Sorted x coordinates of the gutters (empty for single-column pages)
+    """
+    if len(text_elements) < 2 / MIN_COLUMN_SHARE:
+        return []
+    
+    import numpy as np
+    
+    x_origin = int(min(e['x_min'] for e in text_elements))
+    width = int(max(e['x_max'] for e in text_elements)) - x_origin + 1
+    unit = max(1.0, statistics.median(e['y_max'] - e['y_min'] for e in text_elements))
+    
+    # Ink-weighted coverage: every word adds its height across its x-span
+    coverage = np.zeros(width + 1)
+    for e in text_elements:
+        coverage[int(e['x_min']) - x_origin] += e['y_max'] - e['y_min']
+        coverage[int(e['x_max']) - x_origin] -= e['y_max'] - e['y_min']
+    coverage = np.cumsum(coverage)[:width]
+    
+    # Smooth over roughly one character so inter-word gaps do not look like gutters
+    window = max(1, int(unit))
+    smoothed = np.convolve(coverage, np.ones(window) / window, mode='same')
+    ceiling = GUTTER_MAX_DENSITY * smoothed.max()
+    
+    # Nearly-empty runs with text on both sides (runs open to the page edge are margins)
+    below = np.concatenate(([False], smoothed <= ceiling, [False]))
+    changes = np.flatnonzero(np.diff(below.astype(np.int8)))
+    gutters = []
+    for left, right in zip(changes[::2], changes[1::2] - 1):
+        if left > 0 and right < width - 1 and right - left + 1 >= MIN_GUTTER_WIDTH * unit:
+            gutters.append(float(x_origin + (left + right) / 2))
+    
+    # Drop gutters whose neighbouring columns are too small or are just prices
+    while gutters:
+        columns = split_into_columns(text_elements, gutters)
+        for i, column in enumerate(columns):
+            prices = sum(1 for e in column if PRICE_TOKEN.match(e['text']))
+            if len(column) < MIN_COLUMN_SHARE * len(text_elements) or prices > MAX_PRICE_SHARE * len(column):
+                # Merge the offending column into its left neighbour (or the right one for the first)
+                del gutters[max(0, i - 1)]
+                break
+        else:
+            break
+    
+    return gutters
+
+def split_into_columns(text_elements, gutters):
+    """
+    Assigns text elements to the columns delimited by the gutters, by their center x
+    
+    Args:
+        text_elements: Elements as returned by extract_text_elements
+        gutters: Sorted gutter x coordinates
+        
+    Returns:
+        list: One list of elements per column, left to right
+    """
+    columns = [[] for _ in range(len(gutters) + 1)]
+    for element in text_elements:
+        index = sum(1 for gutter in gutters if element['center_x'] > gutter)
+        columns[index].append(element)
+    return columns
+
+def layout_columns(text_elements, split_columns=True, y_tolerance=LINE_Y_TOLERANCE):
+    """
+    Segments the page into columns and assembles the lines of each column
+    
+    Args:
+        text_elements: Elements as returned by extract_text_elements
+        split_columns: Whether to look for column gutters at all
+        y_tolerance: Pixels of tolerance for grouping by vertical alignment
+        
+    Returns:
+        list: One list of lines (see group_elements_into_lines) per column, left to right
+    """
+    gutters = []
+    if split_columns:
+        try:
+            gutters = find_column_gutters(text_elements)
+        except Exception as e:
+            logger.error(f"Column detection failed, treating page as one column: {e}")
+    columns = split_into_columns(text_elements, gutters)
+    return [group_elements_into_lines(column, y_tolerance) for column in columns if column]
+
+def process_text_with_bounding_boxes(vision_response, split_columns=True, correct_skew=False):
     """
     Processes the text from Vision API response using bounding boxes to group text by lines
     
     Args:
         vision_response: The response from Google Cloud Vision API
+        split_columns: Whether to detect layout columns and emit text per column
+        correct_skew: Whether to estimate the page rotation from the word boxes and
+            straighten them before grouping (for images that were not deskewed)
         
     Returns:
-        str: Processed text with each line properly aligned and structured
+        str: Processed text with each line properly aligned and structured,
+             columns separated by COLUMN_BREAK
     """
     try:
         if not vision_response or 'responses' not in vision_response or not vision_response['responses'] or \
@@ -274,63 +946,17 @@ def process_text_with_bounding_boxes(vision_response):
         if not text_annotations:
             return "No text elements found"
         
-        # Extract all text elements with their bounding boxes
-        text_elements = []
-        for annotation in text_annotations:
-            text = annotation['description']
-            vertices = annotation['boundingPoly']['vertices']
-            
-            # Calculate bounding box coordinates
-            x_coords = [v.get('x', 0) for v in vertices if 'x' in v]
-            y_coords = [v.get('y', 0) for v in vertices if 'y' in v]
-            
-            if not x_coords or not y_coords:
-                continue
-                
-            # Calculate center of bounding box
-            x_min, x_max = min(x_coords), max(x_coords)
-            y_min, y_max = min(y_coords), max(y_coords)
-            center_x = (x_min + x_max) / 2
-            center_y = (y_min + y_max) / 2
-            
-            text_elements.append({
-                'text': text,
-                'center_x': center_x,
-                'center_y': center_y,
-                'x_min': x_min
-            })
+        skew_angle = estimate_skew_angle(text_annotations) if correct_skew else 0.0
+        if abs(skew_angle) < MIN_SKEW_CORRECTION:
+            skew_angle = 0.0
+        text_elements = extract_text_elements(text_annotations, skew_angle)
         
-        # Group text elements by vertical position (center_y)
-        y_tolerance = 8  # Pixels of tolerance for grouping by vertical alignment
-        line_groups = {}
+        # Split into columns, then group each column's elements by vertical position (center_y)
+        y_tolerance = LINE_Y_TOLERANCE
+        columns = layout_columns(text_elements, split_columns, y_tolerance)
         
-        for element in text_elements:
-            center_y = element['center_y']
-            
-            # Check if this element can be added to an existing line group
-            found_group = False
-            for group_y in line_groups.keys():
-                if abs(center_y - group_y) <= y_tolerance:
-                    line_groups[group_y].append(element)
-                    found_group = True
-                    break
-            
-            # If no suitable group was found, create a new one
-            if not found_group:
-                line_groups[center_y] = [element]
-        
-        # Sort each line group by x position (left to right)
-        processed_lines = []
-        for group_y, elements in line_groups.items():
-            sorted_elements = sorted(elements, key=lambda e: e['x_min'])
-            line_text = ''.join([e['text'] for e in sorted_elements])
-            processed_lines.append((group_y, line_text))
-        
-        # Sort lines by y position (top to bottom)
-        processed_lines.sort(key=lambda x: x[0])
-        
-        # Join all lines with newlines
-        result_text = '\n'.join([line for _, line in processed_lines])
+        # Join all lines with newlines, and columns with the column break
+        result_text = COLUMN_BREAK.join(['\n'.join([line['text'] for line in lines]) for lines in columns])
         
         # Log the results to a file in the temp_images directory
         try:
@@ -353,7 +979,9 @@ def process_text_with_bounding_boxes(vision_response):
                 # Add detailed information about the processing
                 log_file.write("\n\n===== PROCESSING DETAILS =====\n\n")
                 log_file.write(f"Total text elements: {len(text_elements)}\n")
-                log_file.write(f"Line groups created: {len(line_groups)}\n")
+                log_file.write(f"Skew correction from word geometry: {skew_angle:.2f} degrees\n")
+                log_file.write(f"Columns detected: {len(columns)}\n")
+                log_file.write(f"Line groups created: {sum(len(lines) for lines in columns)}\n")
                 log_file.write(f"Vertical tolerance used: {y_tolerance} pixels\n\n")
                 
                 # Log original text for comparison
@@ -374,6 +1002,41 @@ def process_text_with_bounding_boxes(vision_response):
         logger.exception(f"Error processing text with bounding boxes: {e}")
         return "Error processing text with bounding boxes"
 
+def build_slim_response(vision_response, include_lines=False, split_columns=True, correct_skew=False):
+    """
+    Reduces a detect_text result to the fields the app actually uses
+    
+    The raw Vision payload carries a boundingPoly for every word plus the full
+    page/block/paragraph/symbol tree, which dominates the response size on dense menus.
+    
+    Args:
+        vision_response: The result of detect_text
+        include_lines: Whether to add compact per-line geometry
+        split_columns: Whether lines are assembled per layout column (column by column)
+        correct_skew: Whether line boxes are straightened using the word geometry
+            (coordinates are then in the straightened frame)
+        
+    Returns:
+        dict: original_text, bounding_box_text (when computed) and optionally
+              lines as [text, x_min, y_min, x_max, y_max] arrays
+    """
+    slim = {'original_text': vision_response.get('original_text', '')}
+    if 'bounding_box_text' in vision_response:
+        slim['bounding_box_text'] = vision_response['bounding_box_text']
+    
+    if include_lines:
+        try:
+            text_annotations = vision_response['responses'][0].get('textAnnotations', [])[1:]
+        except (KeyError, IndexError):
+            text_annotations = []
+        skew_angle = estimate_skew_angle(text_annotations) if correct_skew else 0.0
+        if abs(skew_angle) < MIN_SKEW_CORRECTION:
+            skew_angle = 0.0
+        columns = layout_columns(extract_text_elements(text_annotations, skew_angle), split_columns)
+        slim['lines'] = [[line['text']] + line['box'] for lines in columns for line in lines]
+    
+    return slim
+
 def get_detected_text(vision_response):
     """
     Extracts all detected text from Vision API response
@@ -0,0 +1,163 @@
+"""
+Measures the menu-region crop that runs before deskew and upload (MENU_CROP).
+
+Offline (always runs), on SmartMenuApp/assets/test_menus:
+  * the region found, the share of the photo kept and the time to find it;
+  * the upload size and pixel deskew time with and without the crop;
+  * each photo framed in a plain 100 px border of several colours: the
+    region found must still contain everything the unframed photo kept,
+    otherwise the crop is cutting into the menu, and must drop most of the
+    border.
+
+--preview DIR writes each photo with its region drawn in, to check by eye.
+
+Live (--live, needs GOOGLE_VISION_API_KEY): OCRs every photo with the crop
+off and on and lists the lines of the uncropped OCR that are missing from the
+cropped one. Enable MENU_CROP only if no lines are lost on your photos.
+
+Usage:
+    python benchmarks/crop_benchmark.py [--preview DIR] [--live]
+"""
+import argparse
+import base64
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'SmartMenuApp')
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services import vision_service  # noqa: E402
+
+TEST_MENUS = sorted(glob.glob(os.path.join(APP_DIR, 'assets', 'test_menus', 'ThaiMenu*.jpg')))
+# Plain borders the photos are framed in for the containment check
+FRAME_BORDER = 100
+FRAME_COLOURS = {'white': (255, 255, 255), 'black': (0, 0, 0), 'grey': (128, 128, 128)}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def offline_crop_cost(preview_dir=None):
+    import cv2
+    import numpy as np
+
+    print(f"{'menu':<26} {'region (x, y, w, h)':<24} {'kept':>5} {'crop ms':>8} "
+          f"{'upload KB':>10} {'cropped KB':>11} {'deskew ms':>10} {'cropped ms':>11}")
+    for path in TEST_MENUS:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        (cropped, crop), crop_ms = timed(vision_service.crop_to_menu_region, image_bytes)
+        (deskewed, _), deskew_ms = timed(vision_service.deskew_image, image_bytes, False)
+        (cropped_deskewed, _), cropped_deskew_ms = timed(vision_service.deskew_image, cropped, False)
+
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        height, width = img.shape[:2]
+        if crop:
+            region = f"{crop['x']}, {crop['y']}, {crop['width']}, {crop['height']}"
+            kept = crop['width'] * crop['height'] / float(width * height)
+        else:
+            region, kept = 'not cropped', 1.0
+        print(f"{os.path.basename(path):<26} {region:<24} {kept:>5.0%} {crop_ms:>8.0f} "
+              f"{len(base64.b64encode(deskewed)) / 1024:>10.0f} {len(base64.b64encode(cropped_deskewed)) / 1024:>11.0f} "
+              f"{deskew_ms:>10.0f} {crop_ms + cropped_deskew_ms:>11.0f}")
+
+        if preview_dir and crop:
+            cv2.rectangle(img, (crop['x'], crop['y']), (crop['x'] + crop['width'], crop['y'] + crop['height']),
+                          (0, 0, 255), max(2, width // 150))
+        if preview_dir:
+            cv2.imwrite(os.path.join(preview_dir, os.path.basename(path)), img)
+
+
+def framed(image_bytes, colour, border=FRAME_BORDER):
+    """Returns the photo inside a plain border, re-encoded as JPEG"""
+    import cv2
+    import numpy as np
+
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    img = cv2.copyMakeBorder(img, border, border, border, border, cv2.BORDER_CONSTANT, value=colour)
+    return cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes(), img.shape[:2]
+
+
+def offline_frame_check():
+    print(f"\n{'menu':<26} {'border':<8} {'region (x, y, w, h)':<24} {'border left':>11} {'result':<8}")
+    failures = 0
+    for path in TEST_MENUS:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        _, (height, width) = framed(image_bytes, (0, 0, 0), border=0)
+        _, crop = vision_service.crop_to_menu_region(image_bytes)
+        # What the unframed photo kept, in the framed photo's pixels
+        kept = crop or {'x': 0, 'y': 0, 'width': width, 'height': height}
+        for name, colour in FRAME_COLOURS.items():
+            framed_bytes, (framed_h, framed_w) = framed(image_bytes, colour)
+            _, region = vision_service.crop_to_menu_region(framed_bytes)
+            region = region or {'x': 0, 'y': 0, 'width': framed_w, 'height': framed_h}
+            # How far the region reaches past the kept part on each side: negative cuts into it
+            overhang = [kept['x'] + FRAME_BORDER - region['x'],
+                        kept['y'] + FRAME_BORDER - region['y'],
+                        region['x'] + region['width'] - (kept['x'] + kept['width'] + FRAME_BORDER),
+                        region['y'] + region['height'] - (kept['y'] + kept['height'] + FRAME_BORDER)]
+            if min(overhang) < 0:
+                result = 'CUTS'
+            elif crop is None and max(overhang) > FRAME_BORDER / 2:
+                result = 'FRAMED'
+            else:
+                result = 'ok'
+            failures += result != 'ok'
+            box = f"{region['x']}, {region['y']}, {region['width']}, {region['height']}"
+            print(f"{os.path.basename(path):<26} {name:<8} {box:<24} {max(overhang):>9} px {result:<8}")
+    return failures
+
+
+def ocr_lines(path, crop):
+    vision_service.MENU_CROP = crop
+    with open(path, 'rb') as f:
+        result, elapsed = timed(vision_service.detect_text, f, True, False)
+    lines = [line.replace(' ', '') for line in result.get('bounding_box_text', '').split('\n')]
+    return [line for line in lines if line], result.get('original_text', ''), elapsed
+
+
+def live_comparison():
+    print(f"\n{'menu':<26} {'ms (off)':>9} {'ms (on)':>8} {'lines':>6} {'lost':>5}")
+    lost_total = 0
+    for path in TEST_MENUS:
+        lines, _, off_ms = ocr_lines(path, False)
+        _, cropped_text, on_ms = ocr_lines(path, True)
+        cropped_text = cropped_text.replace(' ', '').replace('\n', '')
+        lost = [line for line in lines if line not in cropped_text]
+        lost_total += len(lost)
+        print(f"{os.path.basename(path):<26} {off_ms:>9.0f} {on_ms:>8.0f} {len(lines):>6} {len(lost):>5}")
+        for line in lost:
+            print(f"    lost: {line}")
+    print(f"\n{lost_total} line(s) lost to the crop")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--preview', metavar='DIR', help='write the photos with their menu region drawn in')
+    parser.add_argument('--live', action='store_true', help='call the Vision API (needs GOOGLE_VISION_API_KEY)')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    # Keep debug artefacts out of the real temp_images folder
+    vision_service.TEMP_IMAGES_DIR = tempfile.mkdtemp(prefix='smartmenu_bench_')
+    if args.preview:
+        os.makedirs(args.preview, exist_ok=True)
+
+    offline_crop_cost(args.preview)
+    failures = offline_frame_check()
+    if args.live:
+        live_comparison()
+    if failures:
+        sys.exit(f"{failures} framed photo(s) had menu text cut off or kept their border")
+
+
+if __name__ == '__main__':
+    main()
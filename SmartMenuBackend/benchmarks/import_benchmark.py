@@ -0,0 +1,82 @@
+"""
+Measures worker cold-start cost: import time and resident memory of app.py.
+
+Each scenario runs in a fresh interpreter so nothing is cached between runs.
+
+Usage:
+    python benchmarks/import_benchmark.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter. app.py is loaded by path because the
+# `app` package shadows it for a plain `import app`.
+CHILD_SCRIPT = """
+import importlib.util, json, os, resource, sys, time
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+sys.path.insert(0, os.getcwd())
+baseline = rss_mb()
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('smartmenu_app', 'app.py')
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_s = time.perf_counter() - start
+after_import = rss_mb()
+
+# Cost the first image request pays when the heavy imports were deferred
+start = time.perf_counter()
+module.warm_up()
+first_image_s = time.perf_counter() - start
+
+print(json.dumps({
+    'import_s': import_s,
+    'first_image_import_s': first_image_s,
+    'rss_baseline_mb': baseline,
+    'rss_after_import_mb': after_import,
+    'rss_after_warm_up_mb': rss_mb(),
+}))
+"""
+
+SCENARIOS = {
+    'lazy (default)': {'PRELOAD_HEAVY_IMPORTS': 'false'},
+    'preload': {'PRELOAD_HEAVY_IMPORTS': 'true'},
+}
+
+
+def run_scenario(env_overrides):
+    env = dict(os.environ, **env_overrides)
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<16} {'import s':>9} {'1st image s':>12} {'RSS import MB':>14} {'RSS warm MB':>12}")
+    for name, env in SCENARIOS.items():
+        results = [run_scenario(env) for _ in range(args.runs)]
+        median = lambda key: statistics.median(r[key] for r in results)
+        print(f"{name:<16} {median('import_s'):>9.3f} {median('first_image_import_s'):>12.3f} "
+              f"{median('rss_after_import_mb'):>14.1f} {median('rss_after_warm_up_mb'):>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
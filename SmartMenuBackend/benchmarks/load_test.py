@@ -0,0 +1,341 @@
+"""
+Concurrent load test of the backend under gunicorn, against stubbed upstreams.
+
+For every gunicorn config (WORKERSxTHREADS) the harness boots `gunicorn wsgi:app`
+pointed at benchmarks/stub_upstreams.py, then runs closed-loop clients at
+increasing concurrency until throughput stops growing (the saturation point),
+the error rate or p99 exceeds its limit, or the levels run out.
+
+Scenarios:
+    menu       detect (image upload) -> parse -> translate, as the app does
+    detect     POST /api/vision/detect with the test menu photos
+    parse      POST /api/parse with recorded OCR text
+    translate  POST /api/translate with a parsed menu
+
+Usage:
+    python benchmarks/load_test.py --configs 1x1,2x4,4x2 --levels 1,2,4,8,16,32 \\
+        --duration 20 --scenario menu --stub-args "--openai-latency lognormal:2:0.5"
+"""
+import argparse
+import glob
+import json
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'SmartMenuApp')
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from synthetic_vision import load_default_text  # noqa: E402
+
+# Throughput must grow by this fraction per level, or the previous best is the saturation point
+SATURATION_GAIN = 0.05
+REQUEST_TIMEOUT_SECONDS = 120
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def process_tree_rss_mb(root_pid):
+    """Sums VmRSS of a process and its direct children (gunicorn master + workers)"""
+    pids = [root_pid]
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == root_pid:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    total_kb = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024.0
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class FailedResponse(Exception):
+    """A 200 response whose body reports a failure (the endpoints degrade instead of erroring)"""
+
+
+class Scenario:
+    """Replays one unit of work (a menu or a single endpoint call) against the app"""
+
+    def __init__(self, name, base_url):
+        self.name = name
+        self.base_url = base_url
+        self.images = []
+        for path in sorted(glob.glob(os.path.join(APP_DIR, 'assets', 'test_menus', '*.jpg'))):
+            with open(path, 'rb') as f:
+                self.images.append((os.path.basename(path), f.read()))
+        self.text = load_default_text()
+        self.items = [{'name': line.split(' ')[0], 'price': 100} for line in self.text.split('\n') if line.strip()]
+        self.counter = 0
+        self.detects = 0
+        self.lock = threading.Lock()
+
+    def next_image(self):
+        with self.lock:
+            self.counter += 1
+            self.detects += 1
+            return self.images[self.counter % len(self.images)]
+
+    def detect(self, session):
+        filename, data = self.next_image()
+        response = session.post(f'{self.base_url}/api/vision/detect',
+                                files={'image': (filename, data, 'image/jpeg')},
+                                data={'use_bounding_box': 'true', 'response_mode': 'slim'},
+                                timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        payload = response.json()
+        if 'error' in payload:
+            raise FailedResponse(f"detect failed: {payload['error']}")
+        return payload
+
+    def parse(self, session, text):
+        response = session.post(f'{self.base_url}/api/parse', json={'text': text, 'useAccurateModel': False},
+                                timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        payload = response.json()
+        # Upstream failures come back as "AI parsing failed" or an empty list
+        if not isinstance(payload.get('result'), list) or not payload['result']:
+            raise FailedResponse(f"parse failed: {payload.get('result')}")
+        if payload.get('incomplete_chunks'):
+            raise FailedResponse(f"parse incomplete: {len(payload['incomplete_chunks'])} chunk(s) not parsed")
+        return payload['result']
+
+    def translate(self, session, items):
+        response = session.post(f'{self.base_url}/api/translate', json={'text': items, 'target_lang': 'en'},
+                                timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        payload = response.json()
+        translated = payload.get('translated_text')
+        if not isinstance(translated, list) or not translated:
+            raise FailedResponse(f"translate failed: {translated}")
+        if any(item.get('untranslated') for item in translated):
+            raise FailedResponse('translate failed: names left untranslated')
+        if payload.get('deadline_exceeded'):
+            raise FailedResponse('translate incomplete: deadline exceeded')
+        return translated
+
+    def run_once(self, session):
+        if self.name == 'detect':
+            self.detect(session)
+        elif self.name == 'parse':
+            self.parse(session, self.text)
+        elif self.name == 'translate':
+            self.translate(session, self.items)
+        else:
+            detected = self.detect(session)
+            parsed = self.parse(session, detected.get('bounding_box_text') or detected.get('original_text', ''))
+            self.translate(session, parsed)
+
+
+def stub_vision_calls(stub_url):
+    counts = requests.get(f'{stub_url}/stats', timeout=5).json()['vision']
+    return sum(counts.values())
+
+
+def run_level(scenario, concurrency, duration, server_pid, stub_url):
+    """
+    Runs `concurrency` closed-loop clients for `duration` seconds
+
+    Returns:
+        dict: Throughput, latency percentiles, error rate, peak RSS and (for
+            uploads) the share of detects answered without a Vision call
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    peak_rss = [0.0]
+    done = threading.Event()
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                scenario.run_once(session)
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                with lock:
+                    errors.append(type(e).__name__)
+
+    def sample_rss():
+        while not done.wait(0.5):
+            peak_rss[0] = max(peak_rss[0], process_tree_rss_mb(server_pid))
+
+    # Uploads the app answered from its OCR cache never reach the stub
+    detects_before, vision_before = scenario.detects, stub_vision_calls(stub_url)
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    started = time.monotonic()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.monotonic() - started
+    done.set()
+    sampler.join()
+    detects = scenario.detects - detects_before
+    vision_calls = stub_vision_calls(stub_url) - vision_before
+
+    latencies.sort()
+    total = len(latencies) + len(errors)
+    return {
+        'concurrency': concurrency,
+        'completed': len(latencies),
+        'errors': len(errors),
+        'error_rate': len(errors) / total if total else 0.0,
+        'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.fmean(latencies) if latencies else float('nan'),
+        'peak_rss_mb': peak_rss[0],
+        'ocr_cache_hit_rate': max(0.0, 1 - vision_calls / detects) if detects else None,
+    }
+
+
+def start_gunicorn(workers, threads, port, stub_url, extra_env):
+    env = dict(os.environ)
+    env.update({
+        'GOOGLE_VISION_API_URL': f'{stub_url}/v1/images:annotate',
+        'OPENAI_API_URL': f'{stub_url}/v1/chat/completions',
+        'GOOGLE_TRANSLATE_API_URL': f'{stub_url}/language/translate/v2',
+        'GOOGLE_VISION_API_KEY': 'stub', 'OPENAI_API_KEY': 'stub', 'GOOGLE_TRANSLATE_API_KEY': 'stub',
+        # Measure the box, not our own quota settings
+        'OPENAI_REQUESTS_PER_MINUTE': '0', 'OPENAI_TOKENS_PER_MINUTE': '0',
+        'VISION_REQUESTS_PER_MINUTE': '0', 'TRANSLATE_REQUESTS_PER_MINUTE': '0',
+        'TRANSLATE_TOKENS_PER_MINUTE': '0',
+        'TEMP_IMAGES_DIR': tempfile.mkdtemp(prefix='smartmenu_load_'),
+        # The scenarios replay the same few photos; cached uploads would skip Vision
+        # entirely. Pass --app-env OCR_CACHE_MAX_ENTRIES=64 to measure with the cache.
+        'OCR_CACHE_MAX_ENTRIES': '0',
+        # A fresh cache per config, so entries from earlier runs never count as hits
+        'OCR_CACHE_DIR': tempfile.mkdtemp(prefix='smartmenu_load_ocr_'),
+    })
+    env.update(extra_env)
+    command = [sys.executable, '-m', 'gunicorn', 'wsgi:app', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--threads', str(threads),
+               '--timeout', str(REQUEST_TIMEOUT_SECONDS), '--log-level', 'warning']
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_config(config, args, stub_url, extra_env):
+    workers, threads = (int(n) for n in config.lower().split('x'))
+    port = free_port()
+    server = start_gunicorn(workers, threads, port, stub_url, extra_env)
+    results = []
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        wait_for(f'{base_url}/health')
+        scenario = Scenario(args.scenario, base_url)
+        idle_rss = process_tree_rss_mb(server.pid)
+        print(f"\n== {workers} worker(s) x {threads} thread(s), scenario '{args.scenario}', idle RSS {idle_rss:.0f} MB")
+        print(f"{'conc':>5} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'err %':>6} {'RSS MB':>7} {'OCR hit %':>9}")
+
+        best = None
+        for level in args.levels:
+            result = run_level(scenario, level, args.duration, server.pid, stub_url)
+            results.append(result)
+            hit_rate = result['ocr_cache_hit_rate']
+            print(f"{level:>5} {result['throughput']:>8.2f} {result['p50']:>7.2f} {result['p95']:>7.2f} "
+                  f"{result['p99']:>7.2f} {result['error_rate'] * 100:>6.1f} {result['peak_rss_mb']:>7.0f} "
+                  f"{'-' if hit_rate is None else f'{hit_rate * 100:.1f}':>9}")
+
+            if result['error_rate'] > args.max_error_rate or result['p99'] > args.max_p99:
+                print(f"   stop: error rate or p99 over limit at concurrency {level}")
+                break
+            if best and result['throughput'] < best['throughput'] * (1 + SATURATION_GAIN):
+                print("   stop: throughput no longer growing")
+                break
+            if not best or result['throughput'] > best['throughput']:
+                best = result
+
+        if best:
+            print(f"   saturation point: ~{best['throughput']:.2f} req/s at concurrency {best['concurrency']} "
+                  f"(p99 {best['p99']:.2f}s)")
+        return {'config': config, 'levels': results, 'saturation': best}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default='1x1,2x4', help='comma-separated WORKERSxTHREADS')
+    parser.add_argument('--levels', default='1,2,4,8,16,32', help='comma-separated client concurrency levels')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per level')
+    parser.add_argument('--scenario', choices=['menu', 'detect', 'parse', 'translate'], default='menu')
+    parser.add_argument('--max-error-rate', type=float, default=0.05)
+    parser.add_argument('--max-p99', type=float, default=30.0, help='seconds')
+    parser.add_argument('--stub-args', default='', help='extra arguments for stub_upstreams.py')
+    parser.add_argument('--app-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the app (e.g. DESKEW_MODE=geometry)')
+    parser.add_argument('--output', help='write all results as JSON to this path')
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.levels.split(',')]
+    extra_env = dict(item.split('=', 1) for item in args.app_env)
+
+    stub_port = free_port()
+    stub = subprocess.Popen([sys.executable, os.path.join(BENCHMARKS_DIR, 'stub_upstreams.py'),
+                             '--port', str(stub_port)] + shlex.split(args.stub_args),
+                            stdout=subprocess.DEVNULL)
+    stub_url = f'http://127.0.0.1:{stub_port}'
+    try:
+        wait_for(f'{stub_url}/stats')
+        all_results = [run_config(config, args, stub_url, extra_env) for config in args.configs.split(',')]
+        print(f"\nstub upstream calls: {requests.get(f'{stub_url}/stats').json()}")
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(all_results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
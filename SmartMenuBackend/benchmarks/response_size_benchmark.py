@@ -0,0 +1,72 @@
+"""
+Compares /api/vision/detect response size and serialization time across modes.
+
+Uses a synthetic Vision response built from an OCR text sample, so no API key
+is needed.
+
+Usage:
+    python benchmarks/response_size_benchmark.py [--repeat 4] [--iterations 20]
+"""
+import argparse
+import gzip
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_vision import build_vision_response, load_default_text  # noqa: E402
+from app.services import vision_service  # noqa: E402
+from app.services.vision_service import build_slim_response, process_text_with_bounding_boxes  # noqa: E402
+
+
+def load_app_module():
+    # app.py is shadowed by the `app` package for a plain import
+    spec = importlib.util.spec_from_file_location('smartmenu_app', os.path.join(BACKEND_DIR, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return result, (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=4, help='stack the sample text N times for a denser menu')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    # Keep debug artefacts out of the real temp_images folder
+    vision_service.TEMP_IMAGES_DIR = tempfile.mkdtemp(prefix='smartmenu_bench_')
+    app_module = load_app_module()
+    full = build_vision_response(load_default_text(), repeat=args.repeat)
+    full['bounding_box_text'] = process_text_with_bounding_boxes(full)
+
+    cases = {
+        # Flask 2.2 jsonify: ensure_ascii escapes every Thai character to \uXXXX
+        'full / jsonify': lambda: json.dumps(full).encode('utf-8'),
+        'full / dumps_json': lambda: app_module.dumps_json(full),
+        'slim / dumps_json': lambda: app_module.dumps_json(build_slim_response(full)),
+        'slim+lines / dumps_json': lambda: app_module.dumps_json(build_slim_response(full, include_lines=True)),
+    }
+
+    print(f"{'mode':<26} {'ms':>8} {'bytes':>10} {'gzip':>9} {'br':>9}")
+    for name, fn in cases.items():
+        body, ms = timed(fn, args.iterations)
+        gz = len(gzip.compress(body, compresslevel=5))
+        br = len(app_module.brotli.compress(body, quality=5)) if app_module.brotli else float('nan')
+        print(f"{name:<26} {ms:>8.2f} {len(body):>10} {gz:>9} {br:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Compares pixel deskewing with skew estimation from Vision word geometry.
+
+Offline (always runs):
+  * rotates a synthetic Vision response by known angles and checks the
+    geometry estimate and how many lines are assembled exactly as on the
+    straight page, with and without correction;
+  * times deskew_image (the OpenCV work geometry mode removes) on
+    SmartMenuApp/assets/test_menus.
+
+Live (--live, needs GOOGLE_VISION_API_KEY): runs detect_text on every test
+menu in both modes and scores line assembly by the share of expected dish
+names (src/tests/expected_parse) that appear inside a single line.
+
+Usage:
+    python benchmarks/skew_comparison.py [--live]
+"""
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'SmartMenuApp')
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_vision import build_vision_response, load_default_text  # noqa: E402
+from app.services import vision_service  # noqa: E402
+
+TEST_MENUS = sorted(glob.glob(os.path.join(APP_DIR, 'assets', 'test_menus', 'ThaiMenu*.jpg')))
+EXPECTED_DIR = os.path.join(APP_DIR, 'src', 'tests', 'expected_parse')
+
+
+def rotate_response(response, degrees):
+    """Rotates every word box of a Vision response around the page center"""
+    annotations = response['responses'][0]['textAnnotations']
+    rotated = vision_service.straighten_annotations(annotations[1:], -degrees)
+    for annotation in rotated:
+        annotation['boundingPoly']['vertices'] = [
+            {'x': round(v['x']), 'y': round(v['y'])} for v in annotation['boundingPoly']['vertices']
+        ]
+    return {'responses': [{'textAnnotations': annotations[:1] + rotated}]}
+
+
+def line_texts(response, correct_skew):
+    text = vision_service.process_text_with_bounding_boxes(response, split_columns=False, correct_skew=correct_skew)
+    return text.split('\n')
+
+
+def offline_rotation_check():
+    straight = build_vision_response(load_default_text())
+    reference = set(line_texts(straight, False))
+    print(f"{'angle':>6} {'estimate':>9} {'lines kept (no corr.)':>22} {'lines kept (geometry)':>22}")
+    for angle in (-8, -4, -2, -1, 0, 1, 2, 4, 8):
+        rotated = rotate_response(straight, angle)
+        estimate = vision_service.estimate_skew_angle(rotated['responses'][0]['textAnnotations'][1:])
+        plain = len(reference & set(line_texts(rotated, False))) / len(reference)
+        corrected = len(reference & set(line_texts(rotated, True))) / len(reference)
+        print(f"{angle:>6} {estimate:>9.2f} {plain:>22.0%} {corrected:>22.0%}")
+
+
+def offline_deskew_cost():
+    print(f"\n{'menu':<26} {'pixel deskew ms':>16}")
+    for path in TEST_MENUS:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        start = time.perf_counter()
+        vision_service.deskew_image(image_bytes)
+        print(f"{os.path.basename(path):<26} {(time.perf_counter() - start) * 1000:>16.0f}")
+
+
+def expected_names(menu_path):
+    name = os.path.splitext(os.path.basename(menu_path))[0]
+    expected_path = os.path.join(EXPECTED_DIR, f"{name}.json")
+    if not os.path.exists(expected_path):
+        return None
+    with open(expected_path, encoding='utf-8') as f:
+        return [item['name'].replace(' ', '') for item in json.load(f)]
+
+
+def live_comparison():
+    print(f"\n{'menu':<26} {'mode':<9} {'total ms':>9} {'names in one line':>18}")
+    for path in TEST_MENUS:
+        names = expected_names(path)
+        for mode in ('pixel', 'geometry'):
+            with open(path, 'rb') as f:
+                start = time.perf_counter()
+                result = vision_service.detect_text(f, use_bounding_box=True, split_columns=False, deskew_mode=mode)
+                elapsed = (time.perf_counter() - start) * 1000
+            lines = [line.replace(' ', '') for line in result.get('bounding_box_text', '').split('\n')]
+            score = (sum(1 for n in names if any(n in line for line in lines)) / len(names)) if names else math.nan
+            print(f"{os.path.basename(path):<26} {mode:<9} {elapsed:>9.0f} {score:>18.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--live', action='store_true', help='call the Vision API (needs GOOGLE_VISION_API_KEY)')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    # Keep debug artefacts out of the real temp_images folder
+    vision_service.TEMP_IMAGES_DIR = tempfile.mkdtemp(prefix='smartmenu_bench_')
+
+    offline_rotation_check()
+    offline_deskew_cost()
+    if args.live:
+        live_comparison()
+
+
+if __name__ == '__main__':
+    main()
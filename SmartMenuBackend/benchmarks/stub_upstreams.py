@@ -0,0 +1,179 @@
+"""
+Local stand-ins for the Vision, OpenAI and Translate APIs, for load testing.
+
+One threaded HTTP server answers all three paths with realistic payloads:
+
+    POST /v1/images:annotate              Vision DOCUMENT_TEXT_DETECTION
+    POST /v1/chat/completions             OpenAI chat completion (+ usage)
+    POST /language/translate/v2           Translate v2 (keeps '|||' delimiters)
+
+Each upstream gets its own latency distribution and error rates:
+
+    --vision-latency lognormal:0.8:0.4    median 0.8 s, sigma 0.4
+    --openai-latency uniform:1.0:3.0      uniformly 1-3 s
+    --translate-latency fixed:0.15
+    --openai-error-rate 0.01              HTTP 500 with an error body
+    --openai-429-rate 0.02                HTTP 429 with Retry-After: 1
+
+Usage:
+    python benchmarks/stub_upstreams.py --port 8765 [options]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_vision import build_vision_response, load_default_text  # noqa: E402
+
+UPSTREAMS = {
+    '/v1/images:annotate': 'vision',
+    '/v1/chat/completions': 'openai',
+    '/language/translate/v2': 'translate',
+}
+
+DEFAULT_LATENCY = {
+    'vision': 'lognormal:0.8:0.4',
+    'openai': 'lognormal:2.0:0.5',
+    'translate': 'lognormal:0.15:0.3',
+}
+
+
+def parse_latency(spec):
+    """
+    Parses a latency spec into a sampler returning seconds
+
+    Args:
+        spec (str): 'fixed:S', 'uniform:LOW:HIGH' or 'lognormal:MEDIAN:SIGMA'
+
+    Returns:
+        callable: Zero-argument function returning a delay in seconds
+    """
+    kind, *params = spec.split(':')
+    params = [float(p) for p in params]
+    if kind == 'fixed':
+        return lambda: params[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(params[0], params[1])
+    if kind == 'lognormal':
+        median, sigma = params
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubState:
+    """Configuration and counters shared by all handler threads"""
+
+    def __init__(self, args):
+        self.latency = {name: parse_latency(getattr(args, f'{name}_latency')) for name in DEFAULT_LATENCY}
+        self.error_rate = {name: getattr(args, f'{name}_error_rate') for name in DEFAULT_LATENCY}
+        self.rate_limit_rate = {name: getattr(args, f'{name}_429_rate') for name in DEFAULT_LATENCY}
+        self.vision_body = json.dumps(build_vision_response(load_default_text())).encode('utf-8')
+        self.menu_lines = [line for line in load_default_text().split('\n') if line.strip()]
+        self.counts = {name: {'ok': 0, 'error': 0, 'rate_limited': 0} for name in DEFAULT_LATENCY}
+        self.lock = threading.Lock()
+
+    def count(self, name, outcome):
+        with self.lock:
+            self.counts[name][outcome] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.state.lock:
+                self._send(200, json.dumps(self.state.counts).encode('utf-8'))
+        else:
+            self._send(404, b'{}')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        name = UPSTREAMS.get(self.path.split('?')[0])
+        if name is None:
+            self._send(404, b'{"error": {"message": "unknown stub path"}}')
+            return
+
+        time.sleep(self.state.latency[name]())
+
+        roll = random.random()
+        if roll < self.state.rate_limit_rate[name]:
+            self.state.count(name, 'rate_limited')
+            self._send(429, b'{"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}',
+                       {'Retry-After': '1'})
+            return
+        if roll < self.state.rate_limit_rate[name] + self.state.error_rate[name]:
+            self.state.count(name, 'error')
+            self._send(500, b'{"error": {"message": "Stub upstream error"}}')
+            return
+
+        self.state.count(name, 'ok')
+        if name == 'vision':
+            self._send(200, self.state.vision_body)
+        elif name == 'openai':
+            self._send(200, self._chat_completion(json.loads(body)))
+        else:
+            self._send(200, self._translation(json.loads(body)))
+
+    def _chat_completion(self, payload):
+        prompt = payload['messages'][-1]['content']
+        lines = [line for line in prompt.split('\n')[1:] if line.strip()] or self.state.menu_lines
+        items = [{'name': line.split(' ')[0], 'price': 100} for line in lines]
+        content = json.dumps(items, ensure_ascii=False)
+        prompt_tokens = sum(len(m['content']) for m in payload['messages'])
+        return json.dumps({
+            'choices': [{'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content),
+                      'total_tokens': prompt_tokens + len(content)},
+        }, ensure_ascii=False).encode('utf-8')
+
+    def _translation(self, payload):
+        translated = '|||'.join(f"Dish {i}" for i, _ in enumerate(payload['q'].split('|||')))
+        return json.dumps({'data': {'translations': [{'translatedText': translated}]}}).encode('utf-8')
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    for name, latency in DEFAULT_LATENCY.items():
+        parser.add_argument(f'--{name}-latency', default=latency)
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0.0)
+        parser.add_argument(f'--{name}-429-rate', type=float, default=0.0)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    StubHandler.state = StubState(args)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub upstreams listening on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
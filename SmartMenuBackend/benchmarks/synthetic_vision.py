@@ -0,0 +1,74 @@
+"""
+Builds Vision-API-shaped responses from plain OCR text, for benchmarks and stubs.
+
+Words are laid out on a simple grid (one text line per row) with the same
+textAnnotations / fullTextAnnotation structure the real API returns, down to
+per-symbol bounding boxes, so payload sizes are realistic.
+"""
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OCR_TEXT = os.path.join(os.path.dirname(BACKEND_DIR), 'SmartMenuApp', 'assets', 'ocr_results', 'ThaiMenu1.txt')
+
+CHAR_WIDTH = 14
+LINE_HEIGHT = 40
+WORD_GAP = 12
+
+
+def _poly(x_min, y_min, x_max, y_max):
+    return {'vertices': [
+        {'x': x_min, 'y': y_min}, {'x': x_max, 'y': y_min},
+        {'x': x_max, 'y': y_max}, {'x': x_min, 'y': y_max},
+    ]}
+
+
+def build_vision_response(text, repeat=1):
+    """
+    Args:
+        text (str): OCR text, one menu line per line
+        repeat (int): How many times to stack the text vertically (denser menus)
+
+    Returns:
+        dict: A response shaped like images:annotate with DOCUMENT_TEXT_DETECTION
+    """
+    lines = [line for line in text.split('\n') if line.strip()] * repeat
+    annotations = []
+    words = []
+    for row, line in enumerate(lines):
+        x = 20
+        y_min = 20 + row * LINE_HEIGHT
+        y_max = y_min + LINE_HEIGHT - 10
+        for word in line.split():
+            x_max = x + CHAR_WIDTH * len(word)
+            annotations.append({'description': word, 'boundingPoly': _poly(x, y_min, x_max, y_max)})
+            words.append({
+                'property': {'detectedLanguages': [{'languageCode': 'th'}]},
+                'boundingBox': _poly(x, y_min, x_max, y_max),
+                'symbols': [
+                    {'text': char, 'confidence': 0.98,
+                     'boundingBox': _poly(x + i * CHAR_WIDTH, y_min, x + (i + 1) * CHAR_WIDTH, y_max)}
+                    for i, char in enumerate(word)
+                ],
+                'confidence': 0.97,
+            })
+            x = x_max + WORD_GAP
+
+    full_text = '\n'.join(lines)
+    height = 40 + len(lines) * LINE_HEIGHT
+    page = {
+        'width': 1200, 'height': height,
+        'blocks': [{'boundingBox': _poly(0, 0, 1200, height), 'blockType': 'TEXT', 'confidence': 0.95,
+                    'paragraphs': [{'boundingBox': _poly(0, 0, 1200, height), 'confidence': 0.95, 'words': words}]}],
+    }
+    return {
+        'responses': [{
+            'textAnnotations': [{'locale': 'th', 'description': full_text, 'boundingPoly': _poly(0, 0, 1200, height)}] + annotations,
+            'fullTextAnnotation': {'pages': [page], 'text': full_text},
+        }],
+        'original_text': full_text,
+    }
+
+
+def load_default_text():
+    with open(DEFAULT_OCR_TEXT, encoding='utf-8') as f:
+        return f.read()
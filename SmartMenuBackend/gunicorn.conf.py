@@ -0,0 +1,8 @@
+import os
+
+# Load the app (and, with PRELOAD_HEAVY_IMPORTS=true, OpenCV/numpy) once in the
+# master and fork workers from it, so respawns are cheap and pages are shared.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
@@ -0,0 +1,308 @@
+"""
+Bulk offline ingestion of menu photos, without the Flask app.
+
+Images are streamed from a directory through a pipeline of stages, each with
+its own worker pool and a bounded queue in front of it:
+
+    read -> prepare (crop/deskew) -> ocr (Vision) -> parse (OpenAI) -> translate -> JSONL
+
+Every stage works on a different image at the same time, so throughput is set
+by the slowest stage (normally the most rate-limited upstream) rather than by
+the sum of the stages. Upstream calls go through the same per-upstream rate
+limiters, timeouts and hedging as the API.
+
+Each finished image is appended to the output as one JSON line and flushed.
+The output doubles as the checkpoint: re-running with the same --output skips
+images already recorded there (failed ones too, unless --retry-errors).
+
+Usage:
+    python ingest_menus.py photos/ --output menus.jsonl \\
+        --ocr-workers 8 --parse-workers 8 --translate-workers 4
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Marks the end of the input on a stage's queue
+END = object()
+
+logger = logging.getLogger('ingest_menus')
+
+
+class Stage:
+    """
+    A pool of worker threads applying one step to items from a bounded queue.
+
+    Workers forward each item to the next stage's queue; an item that failed
+    earlier skips straight through. When every worker has seen END, the stage
+    passes END on, one per worker of the next stage.
+    """
+
+    def __init__(self, name, fn, workers, queue_size):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next_stage = None
+        self.output = None
+        self.active = self.workers
+        self.lock = threading.Lock()
+        self.stats = {'items': 0, 'errors': 0, 'busy_seconds': 0.0}
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _forward(self, item):
+        if self.next_stage is not None:
+            self.next_stage.queue.put(item)
+        else:
+            self.output.put(item)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is END:
+                with self.lock:
+                    self.active -= 1
+                    last = self.active == 0
+                if last:
+                    for _ in range(self.next_stage.workers if self.next_stage else 1):
+                        self._forward(END)
+                return
+
+            if 'error' not in item:
+                start = time.perf_counter()
+                try:
+                    self.fn(item)
+                except Exception as e:
+                    item['error'] = f'{self.name}: {e}'
+                elapsed = time.perf_counter() - start
+                item['timings'][self.name] = round(elapsed, 3)
+                with self.lock:
+                    self.stats['items'] += 1
+                    self.stats['busy_seconds'] += elapsed
+                    if 'error' in item:
+                        self.stats['errors'] += 1
+            self._forward(item)
+
+
+def find_images(input_dir):
+    """Yields image paths under input_dir in a stable order"""
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def load_checkpoint(output_path, retry_errors):
+    """
+    Reads the files already recorded in the output, repairing a torn last line
+
+    Returns:
+        set: Relative paths to skip
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'rb+') as f:
+        data = f.read()
+        # A crash mid-write leaves a partial line; drop it so appends stay valid JSONL
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+            data = data[:data.rfind(b'\n') + 1]
+    for line in data.decode('utf-8').splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if retry_errors and 'error' in record:
+            continue
+        done.add(record['file'])
+    return done
+
+
+def build_pipeline(args):
+    """
+    Creates the stages; the app services are imported here, after the environment is set
+
+    Returns:
+        list: Stages in pipeline order
+    """
+    from app.services.vision_service import (prepare_image, annotate_image, offset_annotations,
+                                             add_bounding_box_text, DESKEW_MODE)
+    from app.services.ai_parsing_service import parse_menu_with_ai
+    from app.services.translation_service import translate_text
+    from app.services.ocr_cache import content_hash
+    from app.deadline import set_deadline, reset_deadline, incomplete_work
+
+    deskew_mode = (args.deskew_mode or DESKEW_MODE).lower()
+
+    def prepare(item):
+        with open(os.path.join(args.input_dir, item['file']), 'rb') as f:
+            image_content = f.read()
+        item['content_hash'] = content_hash(image_content)
+        item['_image'], metadata = prepare_image(image_content, deskew_mode, save_artifacts=False)
+        if metadata.get('crop'):
+            item['menu_crop'] = metadata['crop']
+
+    def ocr(item):
+        result = annotate_image(item.pop('_image'))
+        add_bounding_box_text(result, args.split_columns, deskew_mode == 'geometry')
+        offset_annotations(result, item.get('menu_crop'))
+        item['original_text'] = result.get('original_text', '')
+        bounding_box_text = result.get('bounding_box_text', '')
+        # A failed layout pass leaves an error message in place of the text; parse the plain OCR instead
+        if bounding_box_text.startswith('Error processing text'):
+            logger.warning(f"{item['file']}: {bounding_box_text}; using the plain OCR text")
+            bounding_box_text = ''
+        item['bounding_box_text'] = bounding_box_text
+
+    def parse(item):
+        text = item['bounding_box_text'] or item['original_text']
+        if not text or text.startswith('No text'):
+            item['items'] = []
+            return
+        # No deadline here, but collect the chunks whose parse failed
+        token = set_deadline(None)
+        try:
+            parsed = parse_menu_with_ai(text, args.accurate)
+            incomplete = incomplete_work()
+        finally:
+            reset_deadline(token)
+        if not isinstance(parsed, list):
+            raise RuntimeError(parsed)
+        # Keep a partial parse for inspection, but record the image as failed so it is retried
+        item['items'] = parsed
+        if incomplete:
+            item['incomplete_chunks'] = incomplete
+            raise RuntimeError(f"{len(incomplete)} chunk(s) not parsed")
+        if not parsed:
+            raise RuntimeError('no menu items parsed')
+
+    def translate(item):
+        if not item['items']:
+            item['translated'] = []
+            return
+        translated = translate_text(item['items'], args.target_lang)
+        if not isinstance(translated, list):
+            raise RuntimeError(translated)
+        item['translated'] = translated
+
+    stages = [
+        Stage('prepare', prepare, args.prepare_workers, args.queue_size),
+        Stage('ocr', ocr, args.ocr_workers, args.queue_size),
+        Stage('parse', parse, args.parse_workers, args.queue_size),
+    ]
+    if not args.no_translate:
+        stages.append(Stage('translate', translate, args.translate_workers, args.queue_size))
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.next_stage = next_stage
+    return stages
+
+
+def run(args):
+    done = load_checkpoint(args.output, args.retry_errors)
+    pending = [os.path.relpath(path, args.input_dir) for path in find_images(args.input_dir)]
+    pending = [path for path in pending if path not in done]
+    if args.limit:
+        pending = pending[:args.limit]
+    logger.info(f"{len(done)} image(s) already in {args.output}; {len(pending)} to process")
+    if not pending:
+        return
+
+    stages = build_pipeline(args)
+    results = queue.Queue(maxsize=args.queue_size)
+    stages[-1].output = results
+    for stage in stages:
+        stage.start()
+
+    def feed():
+        for path in pending:
+            stages[0].queue.put({'file': path, 'timings': {}})
+        for _ in range(stages[0].workers):
+            stages[0].queue.put(END)
+
+    threading.Thread(target=feed, name='feed', daemon=True).start()
+
+    started = time.monotonic()
+    completed = failed = 0
+    with open(args.output, 'a', encoding='utf-8') as out:
+        while True:
+            item = results.get()
+            if item is END:
+                break
+            item.pop('_image', None)
+            out.write(json.dumps(item, ensure_ascii=False) + '\n')
+            out.flush()
+            completed += 1
+            if 'error' in item:
+                failed += 1
+                logger.warning(f"{item['file']}: {item['error']}")
+            if completed % args.progress_every == 0 or completed == len(pending):
+                rate = completed / (time.monotonic() - started)
+                logger.info(f"{completed}/{len(pending)} done ({failed} failed), {rate:.2f} images/s")
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Finished {completed} image(s) in {elapsed:.1f}s ({completed / elapsed:.2f} images/s)")
+    # The stage with the highest utilisation is the bottleneck
+    for stage in stages:
+        utilisation = stage.stats['busy_seconds'] / (elapsed * stage.workers)
+        mean = stage.stats['busy_seconds'] / stage.stats['items'] if stage.stats['items'] else 0.0
+        logger.info(f"  {stage.name:<9} {stage.workers:>3} workers  {stage.stats['items']:>6} items  "
+                    f"{stage.stats['errors']:>4} errors  mean {mean:.2f}s  utilisation {utilisation:.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_dir', help='directory of menu photos (searched recursively)')
+    parser.add_argument('--output', required=True, help='JSONL results file, also used to resume')
+    parser.add_argument('--retry-errors', action='store_true', help='re-process images recorded with an error')
+    parser.add_argument('--limit', type=int, default=0, help='process at most this many new images')
+    parser.add_argument('--deskew-mode', choices=['pixel', 'geometry'], help='defaults to DESKEW_MODE')
+    parser.add_argument('--no-split-columns', dest='split_columns', action='store_false')
+    parser.add_argument('--accurate', action='store_true', help='parse with the accurate model')
+    parser.add_argument('--target-lang', default='en')
+    parser.add_argument('--no-translate', action='store_true')
+    parser.add_argument('--prepare-workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--ocr-workers', type=int, default=8)
+    parser.add_argument('--parse-workers', type=int, default=8)
+    parser.add_argument('--translate-workers', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=16, help='bound of each queue between stages')
+    parser.add_argument('--artifacts-dir', help='keep the services\' debug files here (default: a temp dir)')
+    parser.add_argument('--progress-every', type=int, default=25)
+    parser.add_argument('--verbose', action='store_true', help='show the services\' own output')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s', stream=sys.stderr)
+    logger.setLevel(logging.INFO)
+
+    with contextlib.ExitStack() as stack:
+        # The services read their config on import; keep their per-call debug files out of temp_images/
+        os.environ['TEMP_IMAGES_DIR'] = args.artifacts_dir or stack.enter_context(
+            tempfile.TemporaryDirectory(prefix='smartmenu_ingest_'))
+        from dotenv import load_dotenv
+        load_dotenv()
+
+        # The services print progress for every call; keep stdout quiet unless asked
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
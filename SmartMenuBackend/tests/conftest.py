@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run from anywhere: the services are imported as the `app` package of the backend
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
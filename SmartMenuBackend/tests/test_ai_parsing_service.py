@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+from app.services import ai_parsing_service
+from app.services.ai_parsing_service import COLUMN_BREAK_CHAR, parse_menu_with_ai, parse_menu_with_rules
+from app.services.hedging import HedgedCaller
+
+
+class UnreachableLimiter:
+    def post(self, url, tokens=0, **kwargs):
+        raise requests.ConnectionError('unreachable')
+
+
+@pytest.fixture
+def openai_down(monkeypatch, tmp_path):
+    """OpenAI cannot be reached and the rules parser is the configured fallback"""
+    monkeypatch.setattr(ai_parsing_service, 'TEMP_IMAGES_DIR', str(tmp_path))
+    monkeypatch.setattr(ai_parsing_service, 'get_limiter', lambda name: UnreachableLimiter())
+    caller = HedgedCaller('openai', fallback=parse_menu_with_rules)
+    monkeypatch.setattr(ai_parsing_service, 'get_hedged_caller', lambda name: caller)
+    return caller
+
+
+def test_lines_with_trailing_prices():
+    text = 'ข้าวผัดหมู 60\nต้มยำกุ้ง 120 บาท\nผัดไทย 50.-'
+    assert parse_menu_with_rules(text) == [
+        {'name': 'ข้าวผัดหมู', 'price': 60},
+        {'name': 'ต้มยำกุ้ง', 'price': 120},
+        {'name': 'ผัดไทย', 'price': 50},
+    ]
+
+
+def test_headings_are_skipped():
+    assert parse_menu_with_rules('อาหารจานเดียว\nข้าวผัดหมู 60') == [{'name': 'ข้าวผัดหมู', 'price': 60}]
+
+
+def test_bare_price_completes_the_previous_line():
+    assert parse_menu_with_rules('ข้าวมันไก่\n45') == [{'name': 'ข้าวมันไก่', 'price': 45}]
+    assert parse_menu_with_rules('45') == []
+
+
+def test_slash_separated_names_and_prices():
+    assert parse_menu_with_rules('หมู/ไก่ 50/60') == [
+        {'name': 'หมู', 'price': 50},
+        {'name': 'ไก่', 'price': 60},
+    ]
+    # Size variants of one dish keep the first price
+    assert parse_menu_with_rules('ข้าวผัด 50/60') == [{'name': 'ข้าวผัด', 'price': 50}]
+
+
+def test_columns_are_parsed_as_lines():
+    text = f'ข้าวผัดหมู 60{COLUMN_BREAK_CHAR}ต้มยำกุ้ง 120'
+    assert [item['name'] for item in parse_menu_with_rules(text)] == ['ข้าวผัดหมู', 'ต้มยำกุ้ง']
+
+
+def test_empty_text():
+    assert parse_menu_with_rules('') == []
+
+
+def test_fallback_gets_the_raw_text(openai_down):
+    # Preprocessing drops short lines, which would lose the bare price
+    assert parse_menu_with_ai('ข้าวมันไก่\n45\nผัดไทย 50') == [
+        {'name': 'ข้าวมันไก่', 'price': 45},
+        {'name': 'ผัดไทย', 'price': 50},
+    ]
+    assert openai_down.stats['fallbacks'] == 1
+
+
+def test_fallback_gets_the_raw_text_of_each_chunk(openai_down):
+    text = f'ข้าวมันไก่\n45{COLUMN_BREAK_CHAR}ต้มยำกุ้ง\n99'
+    assert parse_menu_with_ai(text) == [
+        {'name': 'ข้าวมันไก่', 'price': 45},
+        {'name': 'ต้มยำกุ้ง', 'price': 99},
+    ]
+    assert openai_down.stats['fallbacks'] == 2
+
+
+def test_failure_without_fallback(openai_down):
+    openai_down.fallback = None
+    assert parse_menu_with_ai('ผัดไทย 50').startswith('AI parsing failed')
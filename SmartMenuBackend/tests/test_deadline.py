@@ -0,0 +1,149 @@
+import importlib.util
+import os
+import time
+
+import pytest
+
+from app import deadline
+from app.deadline import (DeadlineExceeded, check_deadline, incomplete_work, record_incomplete,
+                          remaining_time, requested_budget, reset_deadline, set_deadline, timeout_for)
+from app.services import ai_parsing_service, rate_limiter, translation_service
+from app.services.ai_parsing_service import COLUMN_BREAK_CHAR
+from app.services.dish_index import DishIndex
+from app.services.rate_limiter import UpstreamLimiter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def budget():
+    """Starts a deadline `seconds` from now (after the response margin) for the test"""
+    tokens = []
+
+    def start(seconds):
+        tokens.append(set_deadline(None if seconds is None else seconds + deadline.DEADLINE_RESPONSE_MARGIN_SECONDS))
+    yield start
+    for token in reversed(tokens):
+        reset_deadline(token)
+
+
+@pytest.fixture
+def flask_app():
+    # app.py is shadowed by the `app` package for a plain import
+    spec = importlib.util.spec_from_file_location('smartmenu_app', os.path.join(BACKEND_DIR, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_requested_budget(monkeypatch):
+    monkeypatch.setattr(deadline, 'REQUEST_DEADLINE_SECONDS', 0)
+    assert requested_budget(FakeRequest()) == 0
+    assert requested_budget(FakeRequest({'X-Request-Timeout': '4'})) == 4
+    assert requested_budget(FakeRequest({'X-Request-Timeout': 'soon'})) == 0
+    monkeypatch.setattr(deadline, 'REQUEST_DEADLINE_SECONDS', 10)
+    assert requested_budget(FakeRequest()) == 10
+    # The header can shorten the configured budget, never extend it
+    assert requested_budget(FakeRequest({'X-Request-Timeout': '4'})) == 4
+    assert requested_budget(FakeRequest({'X-Request-Timeout': '30'})) == 10
+
+
+def test_without_a_deadline():
+    assert remaining_time() is None
+    assert timeout_for(5) == 5
+    check_deadline('anything')
+    record_incomplete('parse', 0, 'text')
+    assert incomplete_work() == []
+
+
+def test_timeout_is_bounded_by_the_time_left(budget):
+    budget(2)
+    assert 1.5 < timeout_for(30) <= 2
+    assert timeout_for(1) == 1
+    assert 1.5 < timeout_for() <= 2
+
+
+def test_expired_deadline(budget):
+    budget(0)
+    with pytest.raises(DeadlineExceeded, match='before deskew'):
+        check_deadline('deskew')
+    with pytest.raises(DeadlineExceeded):
+        timeout_for(30)
+
+
+def test_open_deadline_only_collects_work(budget):
+    budget(None)
+    assert remaining_time() is None
+    assert timeout_for(5) == 5
+    record_incomplete('parse', 1, 'chunk', reason='failed')
+    assert incomplete_work() == [{'stage': 'parse', 'index': 1, 'text': 'chunk', 'reason': 'failed'}]
+
+
+def test_limiter_sends_nothing_after_the_deadline(budget, monkeypatch):
+    sent = []
+    monkeypatch.setattr(rate_limiter.requests, 'post', lambda *args, **kwargs: sent.append(kwargs))
+    budget(0)
+    with pytest.raises(DeadlineExceeded):
+        UpstreamLimiter('test').post('http://upstream')
+    assert sent == []
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    """Parses each chunk locally: 'slow' chunks take a second, 'broken' ones fail"""
+    def process_menu_chunk(chunk_text, use_accurate_model=False):
+        if 'slow' in chunk_text:
+            time.sleep(1.0)
+        if 'broken' in chunk_text:
+            return 'AI parsing failed: HTTP 500'
+        return [{'name': chunk_text, 'price': 0}]
+    monkeypatch.setattr(ai_parsing_service, 'process_menu_chunk', process_menu_chunk)
+    return COLUMN_BREAK_CHAR.join
+
+
+def test_chunks_cut_off_or_failed_are_incomplete(budget, chunks):
+    budget(0.3)
+    result = ai_parsing_service.parse_menu_with_ai(chunks(['first', 'slow one', 'broken one', 'last']))
+    assert [item['name'] for item in result] == ['first', 'last']
+    assert sorted((c['index'], c['text'], c['reason']) for c in incomplete_work()) == [
+        (1, 'slow one', 'deadline'),
+        (2, 'broken one', 'failed'),
+    ]
+
+
+def test_every_chunk_failed(budget, chunks):
+    budget(None)
+    assert ai_parsing_service.parse_menu_with_ai(chunks(['broken a', 'broken b'])) == 'AI parsing failed: HTTP 500'
+    assert [c['index'] for c in incomplete_work()] == [0, 1]
+
+
+def test_response_flags(budget, flask_app):
+    budget(None)
+    record_incomplete('parse', 2, 'b', reason='failed')
+    payload = flask_app.add_incomplete_work({'result': []})
+    assert 'deadline_exceeded' not in payload
+    assert [c['index'] for c in payload['incomplete_chunks']] == [2]
+
+    record_incomplete('parse', 0, 'a')
+    payload = flask_app.add_incomplete_work({'result': []})
+    assert payload['deadline_exceeded'] is True
+    assert [c['index'] for c in payload['incomplete_chunks']] == [0, 2]
+
+
+def test_translate_returns_local_names_at_the_deadline(budget, monkeypatch, tmp_path):
+    class ExpiredLimiter:
+        def post(self, url, tokens=0, **kwargs):
+            raise DeadlineExceeded('Deadline exceeded while queued for an upstream')
+
+    monkeypatch.setattr(translation_service, 'TEMP_IMAGES_DIR', str(tmp_path))
+    monkeypatch.setattr(translation_service, 'get_dish_index', lambda: DishIndex([('ผัดไทย', 'Pad Thai')]))
+    monkeypatch.setattr(translation_service, 'get_limiter', lambda name: ExpiredLimiter())
+    budget(None)
+    menu = [{'name': 'ผัดไทย', 'price': 50}, {'name': 'เมนูพิเศษ', 'price': 80}]
+    assert translation_service.translate_text(menu) == [{'name': 'Pad Thai', 'thaiName': 'ผัดไทย', 'price': 50}]
+    assert incomplete_work() == [{'stage': 'translate', 'index': 1, 'text': 'เมนูพิเศษ', 'reason': 'deadline'}]
@@ -0,0 +1,58 @@
+import pytest
+
+from app.services.dish_index import DishIndex, normalize_name
+
+
+@pytest.fixture
+def index():
+    return DishIndex([
+        ('ผัดกะเพรา', 'Phat Kaphrao'),
+        ('ต้มยำกุ้ง', 'Tom Yum Goong'),
+        ('ข้าวผัด', 'Fried Rice'),
+        ('ข้าวผัด', 'Duplicate Ignored'),
+        ('', 'No Thai Name'),
+    ])
+
+
+def test_normalize_name():
+    assert normalize_name(' ต้มยำ  กุ้ง. ') == 'ต้มยำกุ้ง'
+    assert normalize_name('ต้มยำ\u200bกุ้ง') == 'ต้มยำกุ้ง'
+    assert normalize_name('กระเพรา หมู') == 'กะเพราหมู'
+    assert normalize_name('หมู , ไก่') == 'หมู/ไก่'
+
+
+def test_exact_lookup_ignores_spacing_and_punctuation(index):
+    assert index.lookup('ต้มยำ กุ้ง') == 'Tom Yum Goong'
+    assert index.lookup('(ต้มยำกุ้ง)') == 'Tom Yum Goong'
+
+
+def test_first_dataset_entry_wins(index):
+    assert len(index) == 3
+    assert index.lookup('ข้าวผัด') == 'Fried Rice'
+
+
+def test_spelling_variant_and_alias(index):
+    assert index.lookup('ผัดกระเพรา') == 'Phat Kaphrao'
+    assert index.lookup('กะเพรา') == 'Phat Kaphrao'
+
+
+def test_protein_suffix(index):
+    assert index.lookup('ข้าวผัดกุ้ง') == 'Fried Rice with Shrimp'
+    # The longest protein wins over its prefix (หมูสับ, not หมู)
+    assert index.lookup('กระเพราหมูสับ') == 'Phat Kaphrao with Minced Pork'
+
+
+def test_alternative_proteins(index):
+    assert index.lookup('กะเพราหมูสับ/ไก่') == 'Phat Kaphrao with Minced Pork or Chicken'
+    assert index.lookup('ข้าวผัด หมู, ไก่') == 'Fried Rice with Pork or Chicken'
+
+
+def test_protein_prefix(index):
+    assert index.lookup('หมูกรอบผัดกะเพรา') == 'Phat Kaphrao with Crispy Pork'
+
+
+def test_unknown_names(index):
+    assert index.lookup('ส้มตำ') is None
+    assert index.lookup('ข้าวผัดอะไรก็ได้') is None
+    assert index.lookup('') is None
+    assert index.lookup(None) is None
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from app.deadline import DeadlineExceeded, reset_deadline, set_deadline
+from app.services import rate_limiter
+from app.services.hedging import HedgedCaller, MIN_LATENCY_SAMPLES
+from app.services.rate_limiter import UpstreamLimiter
+
+
+def response(status_code, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = b'{}'
+    return result
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    Replaces the HTTP call made by the limiter with scripted answers
+
+    Each answer is (seconds, status code or exception[, headers]); the last one
+    repeats. Returns the list of monotonic times the calls were sent at.
+    """
+    sent = []
+    lock = threading.Lock()
+
+    def install(*answers):
+        def post(url, timeout=None, **kwargs):
+            with lock:
+                answer = answers[min(len(sent), len(answers) - 1)]
+                sent.append(time.monotonic())
+            seconds, outcome, headers = (answer + (None,))[:3]
+            time.sleep(seconds)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return response(outcome, headers)
+        monkeypatch.setattr(rate_limiter.requests, 'post', post)
+        return sent
+    return install
+
+
+def make_caller(observed_latency=None, **kwargs):
+    caller = HedgedCaller('test', **kwargs)
+    if observed_latency is not None:
+        for _ in range(MIN_LATENCY_SAMPLES):
+            caller.latency.record(observed_latency)
+    return caller
+
+
+def rules(text):
+    return [{'name': text, 'price': 0}]
+
+
+@pytest.fixture
+def limiter():
+    return UpstreamLimiter('test', max_concurrency=8)
+
+
+def test_plain_call_runs_inline(upstream, limiter):
+    upstream((0.01, 200))
+    caller = make_caller()
+    (result, _), source = caller.call(lambda: limiter.post('http://upstream'))
+    assert (result.status_code, source) == (200, 'primary')
+    assert caller.stats['primary_wins'] == 1
+    assert len(caller.latency.samples) == 1
+
+
+def test_error_response_without_fallback_is_returned(upstream, limiter):
+    upstream((0.0, 500))
+    caller = make_caller()
+    (result, _), source = caller.call(lambda: limiter.post('http://upstream'), fallback_args=('menu',))
+    assert (result.status_code, source) == (500, 'primary')
+    assert caller.stats['failures'] == 1
+    # Failed attempts are not latency samples
+    assert not caller.latency.samples
+
+
+@pytest.mark.parametrize('outcome', [500, requests.ConnectionError('unreachable')])
+def test_failure_runs_the_fallback(upstream, limiter, outcome):
+    upstream((0.0, outcome))
+    caller = make_caller(fallback=rules)
+    assert caller.call(lambda: limiter.post('http://upstream'), fallback_args=('menu',)) == (rules('menu'), 'fallback')
+    assert caller.stats['fallbacks'] == 1
+
+
+def test_connection_error_without_fallback_is_raised(upstream, limiter):
+    upstream((0.0, requests.ConnectionError('unreachable')))
+    with pytest.raises(requests.ConnectionError):
+        make_caller().call(lambda: limiter.post('http://upstream'))
+
+
+def test_fallback_needs_fallback_args(upstream, limiter):
+    upstream((0.0, 500))
+    caller = make_caller(fallback=rules)
+    (result, _), source = caller.call(lambda: limiter.post('http://upstream'))
+    assert (result.status_code, source) == (500, 'primary')
+
+
+def test_slow_primary_is_hedged(upstream, limiter):
+    sent = upstream((1.0, 200), (0.01, 200))
+    caller = make_caller(observed_latency=0.05, hedge=True)
+    start = time.monotonic()
+    _, source = caller.call(lambda: limiter.post('http://upstream'))
+    assert source == 'hedge'
+    assert time.monotonic() - start < 0.6
+    # The hedge goes out after the minimum delay, not the 0.05 s observed
+    assert sent[1] - sent[0] == pytest.approx(0.2, abs=0.1)
+    assert caller.stats['hedged'] == caller.stats['hedge_wins'] == 1
+
+
+def test_at_most_one_hedge(upstream, limiter):
+    sent = upstream((0.7, 200))
+    caller = make_caller(observed_latency=0.05, hedge=True)
+    _, source = caller.call(lambda: limiter.post('http://upstream'))
+    assert source == 'primary'
+    assert len(sent) == 2
+
+
+def test_queued_primary_is_not_hedged(upstream):
+    # The only slot is taken, so the primary waits 0.4 s in the limiter before it is sent
+    limiter = UpstreamLimiter('test', max_concurrency=1)
+    limiter.acquire()
+    threading.Timer(0.4, limiter.release).start()
+    sent = upstream((0.05, 200))
+    caller = make_caller(observed_latency=0.05, hedge=True)
+    _, source = caller.call(lambda: limiter.post('http://upstream'))
+    assert source == 'primary'
+    assert len(sent) == 1
+    assert caller.stats['hedged'] == 0
+
+
+def test_latency_sample_excludes_retry_after(upstream, limiter):
+    upstream((0.0, 429, {'Retry-After': '0.3'}), (0.02, 200))
+    caller = make_caller()
+    start = time.monotonic()
+    caller.call(lambda: limiter.post('http://upstream'))
+    assert time.monotonic() - start >= 0.3
+    assert list(caller.latency.samples)[0] < 0.1
+
+
+def test_budget_runs_the_fallback(upstream, limiter):
+    upstream((1.0, 200))
+    caller = make_caller(budget_seconds=0.2, fallback=rules)
+    start = time.monotonic()
+    assert caller.call(lambda: limiter.post('http://upstream'), fallback_args=('menu',)) == (rules('menu'), 'fallback')
+    assert time.monotonic() - start < 0.5
+
+
+def test_failed_primary_is_not_hedged(upstream, limiter):
+    sent = upstream((0.0, 500))
+    caller = make_caller(observed_latency=0.05, hedge=True, fallback=rules)
+    assert caller.call(lambda: limiter.post('http://upstream'), fallback_args=('menu',))[1] == 'fallback'
+    assert len(sent) == 1
+
+
+def test_waiting_stops_at_the_deadline(upstream, limiter):
+    upstream((1.0, 200))
+    caller = make_caller(observed_latency=5.0, hedge=True)
+    token = set_deadline(0.8)
+    try:
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            caller.call(lambda: limiter.post('http://upstream'))
+        # 0.8 s budget minus the 0.5 s response margin
+        assert time.monotonic() - start < 0.6
+    finally:
+        reset_deadline(token)
@@ -0,0 +1,132 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services.ocr_cache import OcrCache, _pack, hamming_distance, options_key, perceptual_hash
+
+OPTIONS = options_key(True, True, 'pixel')
+DIGESTS = {name: name * 32 for name in 'abcdef'}
+
+
+def result(n):
+    return {'original_text': f'menu {n}', 'bounding_box_text': f'menu {n}'}
+
+
+def jpeg(image):
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(**kwargs):
+        kwargs.setdefault('ttl_seconds', 60)
+        kwargs.setdefault('phash_distance', 0)
+        return OcrCache(directory=str(tmp_path), **kwargs)
+    return make
+
+
+def files(cache):
+    return sorted(os.listdir(cache.directory)) if os.path.isdir(cache.directory) else []
+
+
+@pytest.fixture
+def gradient():
+    return np.tile(np.linspace(0, 255, 320, dtype=np.uint8), (240, 1))
+
+
+def test_hit_returns_a_copy(make_cache):
+    cache = make_cache(max_entries=4)
+    cache.put(DIGESTS['a'].upper(), OPTIONS, result(1))
+    found, match = cache.get(DIGESTS['a'], OPTIONS)
+    assert (found, match) == (result(1), 'exact')
+    found['original_text'] = 'changed'
+    assert cache.get(DIGESTS['a'], OPTIONS)[0] == result(1)
+
+
+def test_options_are_part_of_the_key(make_cache):
+    cache = make_cache(max_entries=4)
+    cache.put(DIGESTS['a'], OPTIONS, result(1))
+    assert cache.get(DIGESTS['a'], options_key(False, True, 'pixel')) == (None, None)
+    assert cache.stats['misses'] == 1
+
+
+def test_lru_eviction_by_count(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.put(DIGESTS['a'], OPTIONS, result(1))
+    cache.put(DIGESTS['b'], OPTIONS, result(2))
+    cache.get(DIGESTS['a'], OPTIONS)
+    cache.put(DIGESTS['c'], OPTIONS, result(3))
+    assert cache.get(DIGESTS['b'], OPTIONS) == (None, None)
+    assert cache.get(DIGESTS['a'], OPTIONS)[0] == result(1)
+    assert cache.get(DIGESTS['c'], OPTIONS)[0] == result(3)
+
+
+def test_eviction_by_bytes(make_cache):
+    size = len(_pack(result(1)))
+    cache = make_cache(max_entries=10, max_bytes=2 * size)
+    for n, name in enumerate('abc', 1):
+        cache.put(DIGESTS[name], OPTIONS, result(n))
+    assert len(files(cache)) == 2
+    assert cache.get(DIGESTS['a'], OPTIONS) == (None, None)
+
+
+def test_storing_an_image_again_replaces_its_entry(make_cache):
+    cache = make_cache(max_entries=4)
+    cache.put(DIGESTS['a'], OPTIONS, result(1))
+    cache.put(DIGESTS['a'], OPTIONS, result(1))
+    assert len(files(cache)) == 1
+
+
+def test_expired_entries_are_dropped(make_cache):
+    cache = make_cache(max_entries=4, ttl_seconds=0)
+    cache.put(DIGESTS['a'], OPTIONS, result(1))
+    assert cache.get(DIGESTS['a'], OPTIONS) == (None, None)
+
+
+def test_disabled_cache(make_cache):
+    cache = make_cache(max_entries=0)
+    cache.put(DIGESTS['a'], OPTIONS, result(1))
+    assert cache.get(DIGESTS['a'], OPTIONS) == (None, None)
+    assert files(cache) == []
+
+
+def test_hamming_distance():
+    assert hamming_distance('ff', 'ff') == 0
+    assert hamming_distance('f0', '0f') == 8
+    assert hamming_distance('01', '03') == 1
+
+
+def test_perceptual_hash_of_a_recompressed_photo_is_close(gradient):
+    noisy = np.clip(gradient.astype(int) + np.random.default_rng(0).integers(-3, 4, gradient.shape), 0, 255)
+    original = perceptual_hash(jpeg(gradient))
+    assert len(original) == 64
+    assert hamming_distance(original, perceptual_hash(jpeg(noisy.astype(np.uint8)))) <= 16
+    assert hamming_distance(original, perceptual_hash(jpeg(gradient[:, ::-1]))) > 128
+
+
+def test_perceptual_hash_of_undecodable_bytes():
+    assert perceptual_hash(b'not an image') is None
+
+
+def test_perceptual_match(make_cache, gradient):
+    cache = make_cache(max_entries=4, phash_distance=8)
+    phash = perceptual_hash(jpeg(gradient))
+    cache.put(DIGESTS['a'], OPTIONS, result(1), phash=phash)
+    assert cache.get(DIGESTS['b'], OPTIONS, phash=phash) == (result(1), 'perceptual')
+    assert cache.get(DIGESTS['b'], OPTIONS, phash=perceptual_hash(jpeg(gradient[:, ::-1]))) == (None, None)
+    assert cache.stats['perceptual_hits'] == 1
+
+
+def test_workers_share_the_cache(make_cache):
+    make_cache(max_entries=4).put(DIGESTS['a'], OPTIONS, result(1))
+    assert make_cache(max_entries=4).get(DIGESTS['a'], OPTIONS) == (result(1), 'exact')
+
+
+def test_client_hashes_never_reach_the_path(make_cache):
+    cache = make_cache(max_entries=4)
+    cache.put('../../etc/passwd', OPTIONS, result(1))
+    cache.put(DIGESTS['a'], options_key(True, True, '../x'), result(1), phash='../y')
+    assert [name.split('_')[:3] for name in files(cache)] == [['11x', DIGESTS['a'], '-']]
+    assert cache.get('../../etc/passwd', OPTIONS) == (None, None)
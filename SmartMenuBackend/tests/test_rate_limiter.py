@@ -0,0 +1,104 @@
+import time
+
+from app.services import rate_limiter
+from app.services.rate_limiter import UpstreamLimiter, is_rate_limited, parse_retry_after
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        if self.body is None:
+            raise ValueError('no JSON body')
+        return self.body
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after(FakeResponse(429, headers={'Retry-After': '2'})) == 2.0
+
+
+def test_parse_retry_after_ms_wins():
+    response = FakeResponse(429, headers={'retry-after-ms': '1500', 'Retry-After': '10'})
+    assert parse_retry_after(response) == 1.5
+
+
+def test_parse_retry_after_http_date():
+    response = FakeResponse(429, headers={'Retry-After': time.strftime('%a, %d %b %Y %H:%M:%S GMT',
+                                                                         time.gmtime(time.time() + 30))})
+    assert 25 <= parse_retry_after(response) <= 30
+
+
+def test_parse_retry_after_missing_or_negative():
+    assert parse_retry_after(FakeResponse(429)) is None
+    assert parse_retry_after(FakeResponse(429, headers={'Retry-After': '-5'})) == 0.0
+
+
+def test_is_rate_limited():
+    assert is_rate_limited(FakeResponse(429))
+    assert is_rate_limited(FakeResponse(429, {'error': {'message': 'slow down'}}))
+    assert not is_rate_limited(FakeResponse(200, {}))
+    assert not is_rate_limited(FakeResponse(500, {'error': {}}))
+
+
+def test_is_rate_limited_openai_quota():
+    assert not is_rate_limited(FakeResponse(429, {'error': {'code': 'insufficient_quota'}}))
+    assert not is_rate_limited(FakeResponse(429, {'error': {'type': 'insufficient_quota'}}))
+
+
+def test_is_rate_limited_google_403():
+    assert is_rate_limited(FakeResponse(403, {'error': {'status': 'RESOURCE_EXHAUSTED'}}))
+    assert is_rate_limited(FakeResponse(403, {'error': {'errors': [{'reason': 'userRateLimitExceeded'}]}}))
+    assert not is_rate_limited(FakeResponse(403, {'error': {'errors': [{'reason': 'forbidden'}]}}))
+    assert not is_rate_limited(FakeResponse(403))
+
+
+def test_window_halves_on_rate_limit_down_to_minimum():
+    limiter = UpstreamLimiter('test', max_concurrency=8, min_concurrency=2)
+    limiter.on_rate_limited()
+    assert limiter.concurrency == 4
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    assert limiter.concurrency == 2
+
+
+def test_window_halves_once_per_congestion_event():
+    limiter = UpstreamLimiter('test', max_concurrency=8)
+    sent_at = time.monotonic()
+    limiter.on_rate_limited(sent_at=sent_at)
+    # Other requests sent before the decrease belong to the same event
+    limiter.on_rate_limited(sent_at=sent_at)
+    assert limiter.concurrency == 4
+    assert limiter.stats['rate_limited'] == 2
+    # A request sent after the decrease is a new event
+    limiter.on_rate_limited(sent_at=time.monotonic())
+    assert limiter.concurrency == 2
+
+
+def test_window_grows_by_one_slot_per_window_of_successes():
+    limiter = UpstreamLimiter('test', max_concurrency=8)
+    limiter.on_rate_limited()
+    for _ in range(4):
+        limiter.on_success()
+    assert 4.9 < limiter.concurrency < 5.0
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.concurrency == 8
+
+
+def test_retry_after_pauses_the_upstream():
+    limiter = UpstreamLimiter('test', max_concurrency=8)
+    limiter.on_rate_limited(retry_after=5)
+    assert limiter.paused_until - time.monotonic() > 4
+
+
+def test_budgets_are_split_across_workers(monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'WEB_CONCURRENCY', 4)
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    monkeypatch.setenv('OPENAI_REQUESTS_PER_MINUTE', '400')
+    monkeypatch.setenv('OPENAI_TOKENS_PER_MINUTE', '0')
+    limiter = rate_limiter.get_limiter('openai')
+    assert limiter.request_bucket.capacity == 100
+    assert limiter.token_bucket is None
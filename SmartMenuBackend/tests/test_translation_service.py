@@ -0,0 +1,76 @@
+import pytest
+import requests
+
+from app.services import translation_service
+from app.services.dish_index import DishIndex
+
+MENU = [{'name': 'ผัดไทย', 'price': 50}, {'name': 'เมนูพิเศษ', 'price': 80}]
+
+
+class FakeResponse:
+    def __init__(self, body=None):
+        self.status_code = 200 if body is not None else 502
+        self.body = body
+
+    def json(self):
+        if self.body is None:
+            raise ValueError('not JSON')
+        return self.body
+
+
+class FakeLimiter:
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = 0
+
+    def post(self, url, tokens=0, **kwargs):
+        self.calls += 1
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome, 0
+
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path):
+    """Installs a fake Translate upstream answering with `outcome`"""
+    monkeypatch.setattr(translation_service, 'TEMP_IMAGES_DIR', str(tmp_path))
+    monkeypatch.setattr(translation_service, 'get_dish_index', lambda: DishIndex([('ผัดไทย', 'Pad Thai')]))
+
+    def install(outcome):
+        limiter = FakeLimiter(outcome)
+        monkeypatch.setattr(translation_service, 'get_limiter', lambda name: limiter)
+        return limiter
+    return install
+
+
+def test_known_dishes_skip_the_api(upstream):
+    limiter = upstream(FakeResponse({}))
+    result = translation_service.translate_text(MENU[:1])
+    assert result == [{'name': 'Pad Thai', 'thaiName': 'ผัดไทย', 'price': 50}]
+    assert limiter.calls == 0
+
+
+def test_api_translates_the_rest(upstream):
+    upstream(FakeResponse({'data': {'translations': [{'translatedText': 'Special Menu'}]}}))
+    result = translation_service.translate_text(MENU)
+    assert [item['name'] for item in result] == ['Pad Thai', 'Special Menu']
+
+
+@pytest.mark.parametrize('outcome', [
+    FakeResponse({'error': {'message': 'quota exceeded'}}),
+    FakeResponse(None),
+    requests.ConnectionError('unreachable'),
+    requests.Timeout('timed out'),
+])
+def test_api_failure_keeps_local_translations(upstream, outcome):
+    upstream(outcome)
+    result = translation_service.translate_text(MENU)
+    assert result == [
+        {'name': 'Pad Thai', 'thaiName': 'ผัดไทย', 'price': 50},
+        {'name': 'เมนูพิเศษ', 'thaiName': 'เมนูพิเศษ', 'price': 80, 'untranslated': True},
+    ]
+
+
+def test_api_failure_without_local_translations(upstream):
+    upstream(requests.ConnectionError('unreachable'))
+    assert translation_service.translate_text(MENU[1:]) == 'Translation failed'
@@ -0,0 +1,144 @@
+import math
+
+import pytest
+
+from app.services.vision_service import estimate_skew_angle, find_column_gutters, straighten_annotations
+
+
+def word(text, x, y, width=100, height=20, angle=0.0):
+    """A Vision word annotation whose box is rotated by `angle` degrees around the origin"""
+    cos_a, sin_a = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    corners = [(x, y), (x + width, y), (x + width, y + height), (x, y + height)]
+    return {'description': text,
+            'boundingPoly': {'vertices': [{'x': cx * cos_a - cy * sin_a, 'y': cx * sin_a + cy * cos_a}
+                                          for cx, cy in corners]}}
+
+
+def element(text, x_min, y_min, width=100, height=20):
+    return {'text': text, 'center_x': x_min + width / 2, 'center_y': y_min + height / 2,
+            'x_min': x_min, 'x_max': x_min + width, 'y_min': y_min, 'y_max': y_min + height}
+
+
+def page(angle=0.0):
+    return [word('คำ', 150 * col, 40 * row, angle=angle) for row in range(5) for col in range(3)]
+
+
+@pytest.mark.parametrize('angle', [0.0, 3.0, -7.5])
+def test_estimate_skew_angle(angle):
+    assert estimate_skew_angle(page(angle)) == pytest.approx(angle, abs=0.01)
+
+
+def test_estimate_skew_ignores_outliers():
+    words = page(4.0) + [word('|', 0, 0, angle=90.0)]
+    assert estimate_skew_angle(words) == pytest.approx(4.0, abs=0.01)
+
+
+def test_estimate_skew_needs_enough_edges():
+    assert estimate_skew_angle(page(5.0)[:2]) == 0.0
+    assert estimate_skew_angle([word('.', 0, 0, width=5, height=5, angle=10.0)] * 10) == 0.0
+
+
+def test_straighten_annotations_levels_the_words():
+    straightened = straighten_annotations(page(6.0), 6.0)
+    assert estimate_skew_angle(straightened) == pytest.approx(0.0, abs=0.01)
+    vertices = straightened[0]['boundingPoly']['vertices']
+    assert vertices[0]['y'] == pytest.approx(vertices[1]['y'])
+    assert straightened[0]['description'] == 'คำ'
+
+
+def test_straighten_annotations_without_vertices():
+    annotations = [{'description': 'x', 'boundingPoly': {}}]
+    assert straighten_annotations(annotations, 5.0) is annotations
+
+
+def test_two_columns_have_one_gutter():
+    elements = ([element('ข้าวผัด', 0, 30 * row) for row in range(12)] +
+                [element('ต้มยำ', 400, 30 * row) for row in range(12)])
+    gutters = find_column_gutters(elements)
+    assert len(gutters) == 1
+    assert 100 < gutters[0] < 400
+
+
+def test_three_columns_have_two_gutters():
+    elements = [element('ข้าวผัด', x, 30 * row) for x in (0, 400, 800) for row in range(12)]
+    gutters = find_column_gutters(elements)
+    assert len(gutters) == 2
+    assert 100 < gutters[0] < 400 < gutters[1] < 800
+
+
+def test_single_column_has_no_gutter():
+    elements = [element('ข้าวผัด', 0, 30 * row) for row in range(24)]
+    assert find_column_gutters(elements) == []
+
+
+def test_price_column_is_not_split_off():
+    elements = ([element('ข้าวผัดหมู', 0, 30 * row, width=200) for row in range(12)] +
+                [element('60', 500, 30 * row, width=40) for row in range(12)])
+    assert find_column_gutters(elements) == []
+    # Vision returns the currency as its own word: "60" "บาท"
+    elements = ([element('ข้าวผัดหมู', 0, 30 * row) for row in range(12)] +
+                [element('60', 500, 30 * row, width=40) for row in range(12)] +
+                [element('บาท', 545, 30 * row, width=40) for row in range(12)])
+    assert find_column_gutters(elements) == []
+
+
+def test_too_few_words_for_columns():
+    elements = [element('ข้าวผัด', 0, 0), element('ต้มยำ', 400, 0)]
+    assert find_column_gutters(elements) == []
+
+
+def framed_page(border_colour):
+    """A synthetic menu (rows of dark 'words' on paper) inside a plain 150 px border"""
+    import numpy as np
+
+    image = np.full((1000, 800), border_colour, dtype=np.uint8)
+    image[150:850, 150:650] = 235
+    for row in range(12):
+        for col in range(3):
+            image[200 + 50 * row:215 + 50 * row, 190 + 140 * col:290 + 140 * col] = 30
+    return image
+
+
+@pytest.mark.parametrize('border_colour', [255, 0, 128])
+def test_plain_border_is_cropped_off(border_colour):
+    import cv2
+
+    from app.services.vision_service import crop_to_menu_region
+
+    _, encoded = cv2.imencode('.jpg', framed_page(border_colour), [cv2.IMWRITE_JPEG_QUALITY, 95])
+    _, crop = crop_to_menu_region(encoded.tobytes())
+    assert crop is not None
+    # Every word, and at most a few pixels of the border
+    assert 135 <= crop['x'] <= 190 and 135 <= crop['y'] <= 200
+    assert 570 <= crop['x'] + crop['width'] <= 665 and 765 <= crop['y'] + crop['height'] <= 865
+
+
+def test_find_content_box_of_uniform_image():
+    import numpy as np
+
+    from app.services.vision_service import find_content_box
+
+    assert find_content_box(np.full((50, 40), 200, dtype=np.uint8)) is None
+
+
+@pytest.mark.parametrize('angle', [0.0, 4.0, -6.5])
+def test_offset_annotations_maps_deskewed_boxes_back(angle):
+    import cv2
+    import numpy as np
+
+    from app.services.vision_service import offset_annotations
+
+    crop = {'x': 40, 'y': 25, 'width': 600, 'height': 801}
+    points = [(10, 20), (590, 30), (300, 400), (0, 800)]
+    # Where deskew_image's rotation puts them on the crop
+    matrix = cv2.getRotationMatrix2D((crop['width'] // 2, crop['height'] // 2), angle, 1.0)
+    rotated = cv2.transform(np.array([points], dtype=np.float64), matrix)[0]
+    vertices = [{'x': float(x), 'y': float(y)} for x, y in rotated]
+    result = {'responses': [{'textAnnotations': [{'description': 'ข้าว',
+                                                  'boundingPoly': {'vertices': vertices}}]}]}
+    offset_annotations(result, dict(crop, angle=angle) if angle else crop)
+    mapped = result['responses'][0]['textAnnotations'][0]['boundingPoly']['vertices']
+    for (x, y), vertex in zip(points, mapped):
+        assert vertex['x'] == pytest.approx(x + crop['x'], abs=1)
+        assert vertex['y'] == pytest.approx(y + crop['y'], abs=1)
+    assert result['menu_crop']['x'] == crop['x']
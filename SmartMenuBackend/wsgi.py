@@ -0,0 +1,16 @@
+"""
+WSGI entry point for gunicorn: `gunicorn wsgi:app`.
+
+The `app/` package shadows `app.py` for a plain `import app`, so `gunicorn app:app`
+cannot find the Flask object. This module loads app.py by path instead.
+"""
+import os
+import importlib.util
+
+_spec = importlib.util.spec_from_file_location(
+    'smartmenu_app', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+)
+_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_module)
+
+app = _module.app